@@ -24,7 +24,7 @@
 """lck.collections
    ---------------
 
-   Various useful collections, currently only an OrderedSet."""
+   Various useful collections."""
 
 from __future__ import absolute_import
 from __future__ import division
@@ -32,3 +32,6 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from .orderedset import OrderedSet
+from .sortedlist import SortedList, SortedSet, SortedDict
+from .filters import BloomFilter, CuckooFilter, FilterFull
+from .ringbuffer import RingBuffer
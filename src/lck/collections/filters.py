@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""lck.collections.filters
+   -----------------------
+
+   Probabilistic membership filters: :class:`BloomFilter` and
+   :class:`CuckooFilter`. Both answer "have we seen this key" using a few
+   bytes per key. A negative answer is always right, a positive answer is
+   wrong with the configured probability. The cuckoo filter also supports
+   removing keys.
+
+   Filters live in a single flat buffer: a small header followed by the
+   table. The buffer is a bytearray for filters created in memory or
+   a memory-mapped file for filters opened with ``load()``, so several
+   processes on a host can share one filter. Concurrent writers must be
+   serialized by the caller, e.g. with
+   :class:`lck.concurrency.SharedMemoryLock`.
+
+   Keys are hashed with MD5 so that fingerprints are the same in every
+   process. Unicode keys are encoded to UTF-8, numbers are hashed by their
+   decimal text so that keys comparing equal (``1``, ``1L``, ``1.0``,
+   ``True``) hash the same. Other keys are rejected with :exc:`TypeError`,
+   convert them to a string first."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import ctypes
+from hashlib import md5
+import math
+import mmap
+import os
+import random
+import struct
+
+_hash_struct = struct.Struct(b'<qq')     # signed to stay within int range
+
+
+def _hashes(key):
+    """Returns two independent 64-bit hashes of `key`, possibly negative."""
+    if isinstance(key, bytes):
+        pass
+    elif isinstance(key, unicode):
+        key = key.encode('utf8')
+    elif isinstance(key, (int, long)):
+        key = str(int(key))
+    elif isinstance(key, float):
+        key = str(int(key)) if key.is_integer() else repr(key)
+    else:
+        raise TypeError("Unsupported key type: {}.".format(
+            type(key).__name__))
+    return _hash_struct.unpack(md5(key).digest())
+
+
+class FilterFull(Exception):
+    """Raised when a key cannot be added to a :class:`CuckooFilter` because
+    it's full."""
+
+
+class _Filter(object):
+    _header_class = None
+
+    def _attach(self, buffer, mapped=None):
+        self._buffer = buffer
+        self._mapped = mapped
+        self._header = self._header_class.from_buffer(buffer)
+        if self._header.magic != self._magic:
+            raise ValueError('Not a {} file.'.format(self.__class__.__name__))
+        self._table = self._table_type().from_buffer(buffer,
+            ctypes.sizeof(self._header_class))
+
+    def _table_type(self):
+        raise NotImplementedError
+
+    def _size(self):
+        return ctypes.sizeof(self._header_class) + ctypes.sizeof(
+            self._table_type())
+
+    def __len__(self):
+        """Returns the number of keys added."""
+        return self._header.count
+
+    def add_many(self, keys):
+        """Adds all `keys` to the filter."""
+        add = self.add
+        for key in keys:
+            add(key)
+
+    def contains_many(self, keys):
+        """Returns a list of booleans telling which of `keys` are (probably)
+        present in the filter."""
+        contains = self.__contains__
+        return [contains(key) for key in keys]
+
+    def save(self, path):
+        """Writes the filter to a file which can be opened with
+        :meth:`load`."""
+        if self._mapped is not None:
+            self._mapped.flush()
+        with open(path, 'wb') as f:
+            f.write(bytes(self._buffer[:self._size()]))
+
+    @classmethod
+    def load(cls, path):
+        """Opens a filter saved with :meth:`save`. The file is memory-mapped
+        in shared mode: keys added by any process are visible to all of
+        them."""
+        self = cls.__new__(cls)
+        fd = os.open(path, os.O_RDWR)
+        try:
+            mapped = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        self._attach(mapped, mapped)
+        return self
+
+    def close(self):
+        """Releases the memory-mapped file, if any. The filter cannot be used
+        afterwards."""
+        if self._mapped is not None:
+            self._header = self._table = None
+            self._mapped.close()
+            self._mapped = None
+
+
+class _BloomHeader(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        (b'magic', ctypes.c_char * 8),
+        (b'num_bits', ctypes.c_uint64),
+        (b'num_hashes', ctypes.c_uint64),
+        (b'capacity', ctypes.c_uint64),
+        (b'count', ctypes.c_uint64),
+        (b'error_rate', ctypes.c_double),
+    ]
+
+
+class BloomFilter(_Filter):
+    """A Bloom filter sized for `capacity` keys with a false positive rate of
+    `error_rate`. Adding more keys than `capacity` increases the error rate.
+    Keys cannot be removed.
+
+    The number of bits is rounded up to a power of two and the step of the
+    double hashing is always odd, so every probe for a key hits a different
+    bit."""
+
+    _header_class = _BloomHeader
+    _magic = b'LCKBLOM2'
+
+    def __init__(self, capacity, error_rate=0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError('Error rate must be between 0 and 1.')
+        required_bits = int(math.ceil(-capacity * math.log(error_rate)
+            / math.log(2) ** 2))
+        num_bits = 1 << max(3, (required_bits - 1).bit_length())
+        num_hashes = max(1, int(round(required_bits / max(capacity, 1)
+            * math.log(2))))
+        header = _BloomHeader(self._magic, num_bits, num_hashes, capacity, 0,
+            error_rate)
+        buffer = bytearray(ctypes.sizeof(header) + (num_bits + 7) // 8)
+        buffer[:ctypes.sizeof(header)] = bytes(bytearray(header))
+        self._attach(buffer)
+
+    def _table_type(self):
+        return ctypes.c_uint8 * ((self._header.num_bits + 7) // 8)
+
+    def _positions(self, key):
+        h1, h2 = _hashes(key)
+        mask = self._header.num_bits - 1
+        h1 &= mask
+        h2 = h2 & mask | 1
+        return [(h1 + i * h2) & mask
+            for i in xrange(self._header.num_hashes)]
+
+    def add(self, key):
+        table = self._table
+        for position in self._positions(key):
+            table[position >> 3] |= 1 << (position & 7)
+        self._header.count += 1
+
+    def __contains__(self, key):
+        table = self._table
+        for position in self._positions(key):
+            if not table[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add_many(self, keys):
+        table = self._table
+        mask = self._header.num_bits - 1
+        hashes = xrange(self._header.num_hashes)
+        added = 0
+        for key in keys:
+            h1, h2 = _hashes(key)
+            h1 &= mask
+            h2 = h2 & mask | 1
+            for i in hashes:
+                position = (h1 + i * h2) & mask
+                table[position >> 3] |= 1 << (position & 7)
+            added += 1
+        self._header.count += added
+
+    def contains_many(self, keys):
+        table = self._table
+        mask = self._header.num_bits - 1
+        hashes = xrange(self._header.num_hashes)
+        result = []
+        append = result.append
+        for key in keys:
+            h1, h2 = _hashes(key)
+            h1 &= mask
+            h2 = h2 & mask | 1
+            for i in hashes:
+                position = (h1 + i * h2) & mask
+                if not table[position >> 3] & (1 << (position & 7)):
+                    append(False)
+                    break
+            else:
+                append(True)
+        return result
+
+    def __repr__(self):
+        return '<{} capacity={} error_rate={} count={}>'.format(
+            self.__class__.__name__, self._header.capacity,
+            self._header.error_rate, self._header.count)
+
+
+class _CuckooHeader(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [
+        (b'magic', ctypes.c_char * 8),
+        (b'num_buckets', ctypes.c_uint64),
+        (b'bucket_size', ctypes.c_uint64),
+        (b'fingerprint_bits', ctypes.c_uint64),
+        (b'capacity', ctypes.c_uint64),
+        (b'count', ctypes.c_uint64),
+        (b'error_rate', ctypes.c_double),
+    ]
+
+
+_fingerprint_types = {8: ctypes.c_uint8, 16: ctypes.c_uint16,
+    32: ctypes.c_uint32}
+
+
+class CuckooFilter(_Filter):
+    """A cuckoo filter sized for `capacity` keys with a false positive rate
+    of about `error_rate`. Unlike a Bloom filter it supports removing keys,
+    provided they were added before. A key added twice is stored twice and
+    has to be removed twice. When the filter is full, :exc:`FilterFull` is
+    raised."""
+
+    _header_class = _CuckooHeader
+    _magic = b'LCKCUCKO'
+    bucket_size = 4
+    max_kicks = 500
+
+    def __init__(self, capacity, error_rate=0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError('Error rate must be between 0 and 1.')
+        bits = math.log(2 * self.bucket_size / error_rate, 2)
+        fingerprint_bits = min(b for b in sorted(_fingerprint_types)
+            if b >= bits or b == 32)
+        num_buckets = 1
+        while num_buckets * self.bucket_size * 0.95 < capacity:
+            num_buckets <<= 1
+        header = _CuckooHeader(self._magic, num_buckets, self.bucket_size,
+            fingerprint_bits, capacity, 0, error_rate)
+        buffer = bytearray(ctypes.sizeof(header) + num_buckets
+            * self.bucket_size * fingerprint_bits // 8)
+        buffer[:ctypes.sizeof(header)] = bytes(bytearray(header))
+        self._attach(buffer)
+
+    def _attach(self, buffer, mapped=None):
+        super(CuckooFilter, self)._attach(buffer, mapped)
+        header = self._header
+        self._mask = header.num_buckets - 1
+        self._slots = header.bucket_size
+        self._max_fingerprint = (1 << header.fingerprint_bits) - 1
+
+    def _table_type(self):
+        header = self._header
+        return (_fingerprint_types[header.fingerprint_bits]
+            * (header.num_buckets * header.bucket_size))
+
+    def _locate(self, key):
+        """Returns the fingerprint of `key` and its two buckets."""
+        h1, h2 = _hashes(key)
+        fingerprint = h2 % self._max_fingerprint + 1
+        index = h1 & self._mask
+        return fingerprint, index, self._alternate(index, fingerprint)
+
+    def _alternate(self, index, fingerprint):
+        return (index ^ (fingerprint * 0x5bd1e995)) & self._mask
+
+    def _find(self, index, fingerprint):
+        """Returns the slot holding `fingerprint` in bucket `index`,
+        or -1."""
+        table = self._table
+        start = index * self._slots
+        for slot in xrange(start, start + self._slots):
+            if table[slot] == fingerprint:
+                return slot
+        return -1
+
+    def add(self, key):
+        fingerprint, i1, i2 = self._locate(key)
+        table = self._table
+        for index in (i1, i2):
+            slot = self._find(index, 0)
+            if slot >= 0:
+                table[slot] = fingerprint
+                self._header.count += 1
+                return
+        # relocate existing fingerprints, remembering how to undo it
+        index = random.choice((i1, i2))
+        swaps = []
+        for kick in xrange(self.max_kicks):
+            slot = index * self._slots + random.randrange(self._slots)
+            swaps.append((slot, table[slot]))
+            fingerprint, table[slot] = table[slot], fingerprint
+            index = self._alternate(index, fingerprint)
+            slot = self._find(index, 0)
+            if slot >= 0:
+                table[slot] = fingerprint
+                self._header.count += 1
+                return
+        for slot, previous in reversed(swaps):
+            table[slot] = previous
+        raise FilterFull('Cannot add {!r}, the filter is full.'.format(key))
+
+    def __contains__(self, key):
+        fingerprint, i1, i2 = self._locate(key)
+        return self._find(i1, fingerprint) >= 0 or \
+            self._find(i2, fingerprint) >= 0
+
+    def discard(self, key):
+        """Removes `key` from the filter. Returns ``True`` if it was
+        (probably) present. Removing a key which was never added may remove
+        another key which happens to share its fingerprint."""
+        fingerprint, i1, i2 = self._locate(key)
+        for index in (i1, i2):
+            slot = self._find(index, fingerprint)
+            if slot >= 0:
+                self._table[slot] = 0
+                self._header.count -= 1
+                return True
+        return False
+
+    def __repr__(self):
+        return '<{} capacity={} error_rate={} count={}>'.format(
+            self.__class__.__name__, self._header.capacity,
+            self._header.error_rate, self._header.count)
@@ -21,9 +21,16 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-"""Taken from Raymond Hettinger's recipe at:
+"""Inspired by Raymond Hettinger's recipe at:
 
 http://code.activestate.com/recipes/576694-orderedset/
+
+Instead of a doubly linked list of three-item lists, the order is kept in
+a plain list of keys. A dictionary maps every key to its position in that
+list. Discarded keys leave a tombstone behind which is cheap, the list is
+compacted once tombstones make up more than half of it. Apart from using
+a fraction of the memory of the original recipe, there are no reference
+cycles so the garbage collector is not involved.
 """
 
 from __future__ import absolute_import
@@ -32,65 +39,400 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import collections
+from itertools import count, islice, izip
 
-KEY, PREV, NEXT = range(3)
+_REMOVED = object()                     # tombstone for discarded keys
 
 class OrderedSet(collections.MutableSet):
     def __init__(self, iterable=None):
-        self.end = end = []
-        end += [None, end, end]         # sentinel node for doubly linked list
-        self.map = {}                   # key --> [key, prev, next]
+        self._map = {}                  # key --> position in self._items
+        self._items = []                # keys in order, with tombstones
+        self._removed = 0               # number of tombstones
+        self._start = 0                 # everything before is a tombstone
+        self._tree = None               # Fenwick tree counting tombstones
         if iterable is not None:
-            self |= iterable
+            self.update(iterable)
+
+    @classmethod
+    def _from_unique(cls, keys):
+        """Creates a set directly from a list of keys known to be unique."""
+        result = cls()
+        result._reset(keys)
+        return result
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return cls(iterable)
+
+    def _reset(self, keys):
+        self._items = keys
+        self._map = dict(izip(keys, count()))
+        self._removed = 0
+        self._start = 0
+        self._tree = None
+
+    def _compact(self):
+        self._reset([k for k in self._items if k is not _REMOVED])
+
+    def _bury(self, index):
+        """Leaves a tombstone at `index`. Trailing tombstones are dropped
+        right away."""
+        items = self._items
+        tree = self._tree
+        if index == len(items) - 1:
+            items.pop()
+            while items and items[-1] is _REMOVED:
+                items.pop()
+                self._removed -= 1
+            if not items:
+                self._start = 0
+            if tree is not None and len(tree) > len(items) + 1:
+                del tree[len(items) + 1:]
+            return
+        items[index] = _REMOVED
+        self._removed += 1
+        if tree is not None:
+            i = index + 1
+            size = len(tree)
+            while i < size:
+                tree[i] += 1
+                i += i & -i
+        if index == self._start:
+            while items[self._start] is _REMOVED:
+                self._start += 1
+        if 2 * self._removed > len(items):
+            self._compact()
+
+    def _tombstone_tree(self):
+        """Returns the Fenwick tree of tombstone counts, bringing it up to
+        date with keys appended since it was last used."""
+        items = self._items
+        tree = self._tree
+        size = len(items)
+        if tree is None or size >= 2 * len(tree):
+            tree = [0] * (size + 1)
+            for i in xrange(1, size + 1):
+                if items[i - 1] is _REMOVED:
+                    tree[i] += 1
+                parent = i + (i & -i)
+                if parent <= size:
+                    tree[parent] += tree[i]
+        else:
+            for i in xrange(len(tree), size + 1):
+                value = 1 if items[i - 1] is _REMOVED else 0
+                child = i - 1
+                stop = i - (i & -i)
+                while child > stop:
+                    value += tree[child]
+                    child -= child & -child
+                tree.append(value)
+        self._tree = tree
+        return tree
+
+    def _position(self, index):
+        """Returns the position in self._items of the key at `index`."""
+        if self._removed == self._start:
+            return self._start + index
+        tree = self._tombstone_tree()
+        size = len(tree) - 1
+        position = 0
+        step = 1 << (size.bit_length() - 1)
+        while step:
+            node = position + step
+            if node <= size:
+                live = step - tree[node]
+                if live <= index:
+                    position = node
+                    index -= live
+            step >>= 1
+        return position
+
+    def _index(self, position):
+        """Returns the index of the key at `position` in self._items."""
+        if self._removed == self._start:
+            return position - self._start
+        tree = self._tombstone_tree()
+        index = position
+        while position:
+            index -= tree[position]
+            position -= position & -position
+        return index
 
     def __len__(self):
-        return len(self.map)
+        return len(self._map)
 
     def __contains__(self, key):
-        return key in self.map
+        return key in self._map
+
+    def __getitem__(self, index):
+        """Returns the key at `index` in O(log n) time, or O(1) if no keys
+        were discarded from the middle of the set. Slicing returns a new
+        OrderedSet."""
+        if isinstance(index, slice):
+            return self._from_unique(self._slice(index))
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('set index out of range')
+        return self._items[self._position(index)]
+
+    def _slice(self, index):
+        start, stop, step = index.indices(len(self))
+        items = self._items
+        if step != 1:
+            position = self._position
+            return [items[position(i)] for i in xrange(start, stop, step)]
+        if start >= stop:
+            return []
+        begin = self._position(start)
+        if self._removed == self._start:
+            return items[begin:begin + stop - start]
+        keys = (k for k in islice(items, begin, None) if k is not _REMOVED)
+        return list(islice(keys, stop - start))
+
+    def index(self, key):
+        """Returns the position of `key` in the set in O(log n) time, or O(1)
+        if no keys were discarded from the middle of the set."""
+        try:
+            position = self._map[key]
+        except KeyError:
+            raise ValueError('{!r} is not in set'.format(key))
+        return self._index(position)
 
     def add(self, key):
-        if key not in self.map:
-            end = self.end
-            curr = end[PREV]
-            curr[NEXT] = end[PREV] = self.map[key] = [key, curr, end]
+        if key not in self._map:
+            self._map[key] = len(self._items)
+            self._items.append(key)
 
     def discard(self, key):
-        if key in self.map:
-            key, prev, next = self.map.pop(key)
-            prev[NEXT] = next
-            next[PREV] = prev
+        if key in self._map:
+            self._bury(self._map.pop(key))
+
+    def update(self, *iterables):
+        """Adds keys from all `iterables`, in order."""
+        mapping = self._map
+        items = self._items
+        append = items.append
+        for iterable in iterables:
+            for key in iterable:
+                if key not in mapping:
+                    mapping[key] = len(items)
+                    append(key)
+
+    def move_to_end(self, key, last=True):
+        """Moves an existing `key` to either end of the set. Raises KeyError
+        if the key is not present. Moving to the front is O(1) only if a key
+        has been discarded from the front before, otherwise it's O(n)."""
+        index = self._map[key]
+        if last:
+            if index != len(self._items) - 1:
+                self._bury(index)
+                self._map[key] = len(self._items)
+                self._items.append(key)
+            return
+        if index == self._start:
+            return
+        if not self._start:
+            items = self._items
+            items[index] = _REMOVED
+            keys = [key]
+            keys.extend(k for k in items if k is not _REMOVED)
+            self._reset(keys)
+            return
+        # reuse the tombstone in front
+        self._start -= 1
+        self._removed -= 1
+        self._items[self._start] = key
+        self._map[key] = self._start
+        tree = self._tree
+        if tree is not None:
+            i = self._start + 1
+            size = len(tree)
+            while i < size:
+                tree[i] -= 1
+                i += i & -i
+        self._bury(index)
 
     def __iter__(self):
-        end = self.end
-        curr = end[NEXT]
-        while curr is not end:
-            yield curr[KEY]
-            curr = curr[NEXT]
+        if not self._removed:
+            return iter(self._items)
+        return (k for k in self._items if k is not _REMOVED)
 
     def __reversed__(self):
-        end = self.end
-        curr = end[PREV]
-        while curr is not end:
-            yield curr[KEY]
-            curr = curr[PREV]
+        if not self._removed:
+            return reversed(self._items)
+        return (k for k in reversed(self._items) if k is not _REMOVED)
 
-    def pop(self, last=True):
+    def pop(self, last=True, index=None):
+        """Removes and returns the last key, or the first one if `last` is
+        false. If `index` is given, the key at that position is removed
+        instead, e.g. ``s.pop(index=2)``."""
+        if index is None:
+            index = -1 if last else 0
         if not self:
             raise KeyError('set is empty')
-        key = next(reversed(self)) if last else next(iter(self))
+        # trailing tombstones are never kept
+        if index == -1:
+            key = self._items[-1]
+        elif index == 0:
+            key = self._items[self._start]
+        else:
+            key = self[index]
         self.discard(key)
         return key
 
+    def clear(self):
+        self._reset([])
+
     def __repr__(self):
         if not self:
             return '%s()' % (self.__class__.__name__,)
         return '%s(%r)' % (self.__class__.__name__, list(self))
 
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def copy(self):
+        return self._from_unique(list(self))
+
+    __copy__ = copy
+
+    def union(self, *others):
+        """Returns keys of this set followed by new keys from `others`,
+        in order."""
+        result = self.copy()
+        result.update(*others)
+        return result
+
+    def intersection(self, *others):
+        """Returns keys of this set present in all `others`, in the order of
+        this set."""
+        containers = [_container(other) for other in others]
+        if len(containers) == 1:
+            other = containers[0]
+            return self._from_unique([k for k in self if k in other])
+        return self._from_unique([k for k in self
+            if all(k in other for other in containers)])
+
+    def difference(self, *others):
+        """Returns keys of this set not present in any of `others`, in the
+        order of this set."""
+        containers = [_container(other) for other in others]
+        if len(containers) == 1:
+            other = containers[0]
+            return self._from_unique([k for k in self if k not in other])
+        return self._from_unique([k for k in self
+            if not any(k in other for other in containers)])
+
+    def symmetric_difference(self, other):
+        """Returns keys of this set not present in `other`, followed by keys
+        of `other` not present in this set, in order."""
+        other = _ordered_container(other)
+        keys = [k for k in self if k not in other]
+        mapping = self._map
+        keys.extend(k for k in other if k not in mapping)
+        return self._from_unique(keys)
+
+    def _replace(self, other):
+        self._map = other._map
+        self._items = other._items
+        self._removed = other._removed
+        self._start = other._start
+        self._tree = other._tree
+
+    def intersection_update(self, *others):
+        self._replace(self.intersection(*others))
+
+    def difference_update(self, *others):
+        self._replace(self.difference(*others))
+
+    def symmetric_difference_update(self, other):
+        self._replace(self.symmetric_difference(other))
+
+    def issubset(self, other):
+        other = _container(other)
+        if len(self) > len(other):
+            return False
+        for key in self:
+            if key not in other:
+                return False
+        return True
+
+    def issuperset(self, other):
+        mapping = self._map
+        for key in other:
+            if key not in mapping:
+                return False
+        return True
+
+    def __or__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.union(other)
+
+    def __and__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.difference(other)
+
+    def __xor__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.symmetric_difference(other)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
     def __eq__(self, other):
         if isinstance(other, OrderedSet):
-            return len(self) == len(other) and list(self) == list(other)
+            if len(self) != len(other):
+                return False
+            if not self._removed and not other._removed:
+                return self._items == other._items
+            for mine, theirs in izip(self, other):
+                if mine != theirs:
+                    return False
+            return True
+        if isinstance(other, collections.Set):
+            return len(self) == len(other) and self.issubset(other)
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
         return set(self) == set(other)
 
-    def __del__(self):
-        self.clear()                    # remove circular references
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+
+def _container(iterable):
+    """Returns `iterable` if it supports fast membership tests, otherwise
+    a set built from it."""
+    if isinstance(iterable, (set, frozenset, dict, OrderedSet)):
+        return iterable
+    return set(iterable)
+
+
+def _ordered_container(iterable):
+    """Like `_container` but also keeps the order of the keys."""
+    if isinstance(iterable, OrderedSet):
+        return iterable
+    return OrderedSet(iterable)
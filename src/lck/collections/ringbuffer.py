@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""lck.collections.ringbuffer
+   --------------------------
+
+   A fixed-capacity ring buffer of numbers stored unboxed in an
+   :class:`array.array`. Appending is O(1), once the buffer is full the
+   oldest value is overwritten. The current window can be handed over to
+   other libraries without copying via :meth:`RingBuffer.views`. Aggregates
+   use NumPy when it's installed and fall back to pure Python otherwise."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from array import array
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RingBuffer(object):
+    """A ring buffer holding at most `capacity` values of the given
+    `typecode` (see :mod:`array`), by default double precision floats.
+    Iteration and indexing go from the oldest value to the newest."""
+
+    def __init__(self, capacity, typecode=b'd'):
+        if capacity < 1:
+            raise ValueError('Capacity must be positive.')
+        self.capacity = capacity
+        self.typecode = typecode
+        self._data = array(typecode, [0]) * capacity
+        self._start = 0                 # position of the oldest value
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def full(self):
+        return self._len == self.capacity
+
+    def append(self, value):
+        """Adds `value`, overwriting the oldest one if the buffer is full."""
+        if self._len < self.capacity:
+            end = self._start + self._len
+            if end >= self.capacity:
+                end -= self.capacity
+            self._data[end] = value
+            self._len += 1
+        else:
+            self._data[self._start] = value
+            self._start += 1
+            if self._start == self.capacity:
+                self._start = 0
+
+    def extend(self, values):
+        """Adds all `values` using slice assignments instead of a loop."""
+        if not isinstance(values, array) or values.typecode != self.typecode:
+            values = array(self.typecode, values)
+        capacity = self.capacity
+        data = self._data
+        if len(values) >= capacity:
+            data[:] = values[-capacity:]
+            self._start = 0
+            self._len = capacity
+            return
+        end = (self._start + self._len) % capacity
+        head = min(len(values), capacity - end)
+        data[end:end + head] = values[:head]
+        data[:len(values) - head] = values[head:]
+        overflow = self._len + len(values) - capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % capacity
+            self._len = capacity
+        else:
+            self._len += len(values)
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+
+    def _segments(self):
+        """Returns (start, stop) positions of the window in self._data,
+        oldest first."""
+        end = self._start + self._len
+        if end <= self.capacity:
+            return [(self._start, end)]
+        return [(self._start, self.capacity), (0, end - self.capacity)]
+
+    def views(self):
+        """Returns the current window as a tuple of one or two zero-copy
+        buffer objects, oldest values first. They can be passed to anything
+        accepting the buffer protocol, e.g. ``numpy.frombuffer(view,
+        dtype)``. The views are only valid until the next modification."""
+        if not self._len:
+            return ()
+        size = self._data.itemsize
+        return tuple(buffer(self._data, start * size, (stop - start) * size)
+            for start, stop in self._segments())
+
+    def tolist(self):
+        data = self._data
+        result = []
+        for start, stop in self._segments():
+            result.extend(data[start:stop])
+        return result
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('ring buffer index out of range')
+        index += self._start
+        if index >= self.capacity:
+            index -= self.capacity
+        return self._data[index]
+
+    def _arrays(self):
+        """Returns the window as NumPy views without copying."""
+        dtype = numpy.dtype(self.typecode)
+        data = numpy.frombuffer(self._data, dtype)
+        return [data[start:stop] for start, stop in self._segments()]
+
+    def _values(self):
+        """Returns an unordered copy of the window; cheaper than tolist()."""
+        if self._len == self.capacity:
+            return self._data
+        return self._data[self._start:self._start + self._len]
+
+    def sum(self):
+        if numpy is not None:
+            return sum(part.sum() for part in self._arrays()).item() \
+                if self._len else 0
+        if self.typecode in 'fd':
+            return math.fsum(self._values())
+        return sum(self._values())
+
+    def mean(self):
+        if not self._len:
+            raise ValueError('mean of an empty ring buffer')
+        return self.sum() / self._len
+
+    def min(self):
+        if not self._len:
+            raise ValueError('min of an empty ring buffer')
+        if numpy is not None:
+            return min(part.min() for part in self._arrays()).item()
+        return min(self._values())
+
+    def max(self):
+        if not self._len:
+            raise ValueError('max of an empty ring buffer')
+        if numpy is not None:
+            return max(part.max() for part in self._arrays()).item()
+        return max(self._values())
+
+    def percentiles(self, qs):
+        """Returns a list of percentiles of the window for every `q` in `qs`,
+        0 <= `q` <= 100. Values between data points are linearly
+        interpolated, like :func:`numpy.percentile` does by default."""
+        if not self._len:
+            raise ValueError('percentile of an empty ring buffer')
+        if numpy is not None:
+            values = numpy.concatenate(self._arrays())
+            return [p.item() for p in numpy.percentile(values, list(qs))]
+        values = sorted(self._values())
+        last = len(values) - 1
+        result = []
+        for q in qs:
+            if not 0 <= q <= 100:
+                raise ValueError('Percentiles must be between 0 and 100.')
+            position = last * q / 100
+            lower = int(position)
+            upper = min(lower + 1, last)
+            fraction = position - lower
+            result.append(values[lower] + (values[upper] - values[lower])
+                * fraction)
+        return result
+
+    def percentile(self, q):
+        return self.percentiles([q])[0]
+
+    def __repr__(self):
+        return '%s(%d, %r)' % (self.__class__.__name__, self.capacity,
+            self.tolist())
@@ -0,0 +1,701 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""lck.collections.sortedlist
+   --------------------------
+
+   Sorted containers: :class:`SortedList`, :class:`SortedSet` and
+   :class:`SortedDict`.
+
+   Values are kept in a list of sorted sublists, each holding between
+   ``load / 2`` and ``2 * load`` values, plus a list of the sublists'
+   maximums. Inserting or deleting bisects the maximums and then a single
+   sublist, so only a short list is ever shifted in memory. Positional
+   access uses a Fenwick tree of the sublists' lengths, rebuilt lazily
+   when sublists are split or merged.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from bisect import bisect_left, bisect_right, insort
+import collections
+from itertools import chain, islice, izip
+
+DEFAULT_LOAD = 1000
+
+
+class SortedList(collections.Sequence):
+    """A sequence keeping its values sorted. Insertion and deletion take
+    O(log n) time, so does positional access. Duplicates are allowed."""
+
+    def __init__(self, iterable=None, load=DEFAULT_LOAD):
+        self._load = load
+        self._len = 0
+        self._lists = []                # sorted sublists
+        self._maxes = []                # the last value of every sublist
+        self._tree = None               # Fenwick tree of sublist lengths
+        if iterable is not None:
+            self.update(iterable)
+
+    def _reset(self, values):
+        """Replaces all contents with an already sorted list of values."""
+        load = self._load
+        self._lists = [values[i:i + load]
+            for i in xrange(0, len(values), load)]
+        self._maxes = [sublist[-1] for sublist in self._lists]
+        self._len = len(values)
+        self._tree = None
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, value):
+        maxes = self._maxes
+        pos = bisect_left(maxes, value)
+        if pos == len(maxes):
+            return False
+        sublist = self._lists[pos]
+        idx = bisect_left(sublist, value)
+        return sublist[idx] == value
+
+    def __iter__(self):
+        return chain.from_iterable(self._lists)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(sublist)
+            for sublist in reversed(self._lists))
+
+    def add(self, value):
+        """Inserts `value` keeping the list sorted."""
+        maxes = self._maxes
+        if not maxes:
+            self._lists.append([value])
+            maxes.append(value)
+            self._len = 1
+            self._tree = None
+            return
+        pos = bisect_right(maxes, value)
+        if pos == len(maxes):
+            pos -= 1
+            self._lists[pos].append(value)
+            maxes[pos] = value
+        else:
+            insort(self._lists[pos], value)
+        self._len += 1
+        self._grown(pos)
+
+    def update(self, iterable):
+        """Inserts all values from `iterable`."""
+        values = sorted(iterable)
+        if not values:
+            return
+        if 4 * len(values) >= self._len:
+            if self._len:
+                values.extend(self)
+                values.sort()
+            self._reset(values)
+            return
+        for value in values:
+            self.add(value)
+
+    def _grown(self, pos):
+        sublist = self._lists[pos]
+        if len(sublist) > 2 * self._load:
+            half = sublist[self._load:]
+            del sublist[self._load:]
+            self._maxes[pos] = sublist[-1]
+            self._lists.insert(pos + 1, half)
+            self._maxes.insert(pos + 1, half[-1])
+            self._tree = None
+        elif self._tree is not None:
+            self._tree_add(pos, 1)
+
+    def _delete(self, pos, idx):
+        """Deletes the value at index `idx` of sublist `pos`."""
+        lists = self._lists
+        sublist = lists[pos]
+        del sublist[idx]
+        self._len -= 1
+        if not sublist:
+            del lists[pos]
+            del self._maxes[pos]
+            self._tree = None
+            return
+        self._maxes[pos] = sublist[-1]
+        if len(sublist) < self._load // 2 and len(lists) > 1:
+            # merge with a neighbour, splitting again if that's too large
+            if not pos:
+                pos = 1
+            lists[pos - 1].extend(lists.pop(pos))
+            del self._maxes[pos]
+            self._maxes[pos - 1] = lists[pos - 1][-1]
+            self._tree = None
+            self._grown(pos - 1)
+        elif self._tree is not None:
+            self._tree_add(pos, -1)
+
+    def discard(self, value):
+        """Removes one occurrence of `value` if present."""
+        maxes = self._maxes
+        pos = bisect_left(maxes, value)
+        if pos == len(maxes):
+            return
+        sublist = self._lists[pos]
+        idx = bisect_left(sublist, value)
+        if sublist[idx] == value:
+            self._delete(pos, idx)
+
+    def remove(self, value):
+        """Removes one occurrence of `value`. Raises ValueError if not
+        present."""
+        if value not in self:
+            raise ValueError('{!r} not in list'.format(value))
+        self.discard(value)
+
+    def clear(self):
+        self._reset([])
+
+    # positional access
+
+    def _build_tree(self):
+        lengths = [len(sublist) for sublist in self._lists]
+        size = len(lengths)
+        tree = [0] + lengths
+        for i in xrange(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        return tree
+
+    def _tree_add(self, pos, delta):
+        tree = self._tree
+        i = pos + 1
+        size = len(tree)
+        while i < size:
+            tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index):
+        """Returns (sublist position, index within sublist) for a global
+        non-negative `index`."""
+        lists = self._lists
+        if index < len(lists[0]):
+            return 0, index
+        tree = self._tree or self._build_tree()
+        size = len(tree) - 1
+        pos = 0
+        step = 1 << (size.bit_length() - 1)
+        while step:
+            node = pos + step
+            if node <= size and tree[node] <= index:
+                pos = node
+                index -= tree[node]
+            step >>= 1
+        return pos, index
+
+    def _offset(self, pos, idx):
+        """Returns the global index of value `idx` in sublist `pos`."""
+        if not pos:
+            return idx
+        tree = self._tree or self._build_tree()
+        while pos:
+            idx += tree[pos]
+            pos -= pos & -pos
+        return idx
+
+    def _normalize(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('list index out of range')
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._slice(index))
+        if index == -1 and self._len:
+            return self._maxes[-1]
+        pos, idx = self._locate(self._normalize(index))
+        return self._lists[pos][idx]
+
+    def _slice(self, index):
+        start, stop, step = index.indices(self._len)
+        if step == 1:
+            return self._islice(start, stop)
+        return (self[i] for i in xrange(start, stop, step))
+
+    def _islice(self, start, stop, reverse=False):
+        """Iterates over values with indices from `start` to `stop`."""
+        if start >= stop:
+            return iter(())
+        lists = self._lists
+        start_pos, start_idx = self._locate(start)
+        stop_pos, stop_idx = self._locate(stop - 1)
+        if start_pos == stop_pos:
+            sublist = lists[start_pos]
+            if reverse:
+                return reversed(sublist[start_idx:stop_idx + 1])
+            return iter(sublist[start_idx:stop_idx + 1])
+        if reverse:
+            parts = [reversed(lists[stop_pos][:stop_idx + 1])]
+            parts.extend(reversed(lists[pos])
+                for pos in xrange(stop_pos - 1, start_pos, -1))
+            parts.append(reversed(lists[start_pos][start_idx:]))
+        else:
+            parts = [islice(lists[start_pos], start_idx, None)]
+            parts.extend(lists[pos] for pos in xrange(start_pos + 1, stop_pos))
+            parts.append(islice(lists[stop_pos], stop_idx + 1))
+        return chain.from_iterable(parts)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step == 1 and start == 0 and stop == self._len:
+                self.clear()
+                return
+            indices = xrange(start, stop, step)
+            for i in sorted(indices, reverse=True):
+                self._delete(*self._locate(i))
+            return
+        self._delete(*self._locate(self._normalize(index)))
+
+    def pop(self, index=-1):
+        """Removes and returns the value at `index`, by default the last
+        one."""
+        if not self._len:
+            raise IndexError('pop from empty list')
+        pos, idx = self._locate(self._normalize(index))
+        value = self._lists[pos][idx]
+        self._delete(pos, idx)
+        return value
+
+    def bisect_left(self, value):
+        """Returns the index where `value` would be inserted, before any
+        equal values."""
+        maxes = self._maxes
+        pos = bisect_left(maxes, value)
+        if pos == len(maxes):
+            return self._len
+        return self._offset(pos, bisect_left(self._lists[pos], value))
+
+    def bisect_right(self, value):
+        """Returns the index where `value` would be inserted, after any
+        equal values."""
+        maxes = self._maxes
+        pos = bisect_right(maxes, value)
+        if pos == len(maxes):
+            return self._len
+        return self._offset(pos, bisect_right(self._lists[pos], value))
+
+    bisect = bisect_right
+
+    def index(self, value, start=None, stop=None):
+        """Returns the index of the first occurrence of `value`. Raises
+        ValueError if not present."""
+        start, stop, _ = slice(start, stop).indices(self._len)
+        index = max(self.bisect_left(value), start)
+        if index < min(self.bisect_right(value), stop):
+            return index
+        raise ValueError('{!r} is not in list'.format(value))
+
+    def count(self, value):
+        return self.bisect_right(value) - self.bisect_left(value)
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, True),
+        reverse=False):
+        """Iterates over values between `minimum` and `maximum`. ``None``
+        means no bound. `inclusive` tells whether each bound is included."""
+        if minimum is None:
+            start = 0
+        elif inclusive[0]:
+            start = self.bisect_left(minimum)
+        else:
+            start = self.bisect_right(minimum)
+        if maximum is None:
+            stop = self._len
+        elif inclusive[1]:
+            stop = self.bisect_right(maximum)
+        else:
+            stop = self.bisect_left(maximum)
+        return self._islice(start, stop, reverse=reverse)
+
+    def copy(self):
+        result = self.__class__(load=self._load)
+        result._reset(list(self))
+        return result
+
+    __copy__ = copy
+
+    def __reduce__(self):
+        return self.__class__, (list(self), self._load)
+
+    def __eq__(self, other):
+        if not isinstance(other, collections.Sequence):
+            return NotImplemented
+        return self._len == len(other) and all(a == b
+            for a, b in izip(self, other))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+
+class SortedSet(collections.MutableSet):
+    """A set iterating over its keys in sorted order. Membership tests take
+    O(1) time, insertion, deletion and positional access O(log n). The API
+    follows :class:`OrderedSet` where the two overlap."""
+
+    def __init__(self, iterable=None, load=DEFAULT_LOAD):
+        self._set = set()
+        self._list = SortedList(load=load)
+        if iterable is not None:
+            self.update(iterable)
+
+    @classmethod
+    def _from_sorted(cls, keys, load=DEFAULT_LOAD):
+        """Creates a set directly from a sorted list of unique keys."""
+        result = cls(load=load)
+        result._set = set(keys)
+        result._list._reset(keys)
+        return result
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return cls(iterable)
+
+    def __len__(self):
+        return len(self._set)
+
+    def __contains__(self, key):
+        return key in self._set
+
+    def __iter__(self):
+        return iter(self._list)
+
+    def __reversed__(self):
+        return reversed(self._list)
+
+    def add(self, key):
+        if key not in self._set:
+            self._set.add(key)
+            self._list.add(key)
+
+    def discard(self, key):
+        if key in self._set:
+            self._set.remove(key)
+            self._list.discard(key)
+
+    def update(self, *iterables):
+        """Adds keys from all `iterables`."""
+        keys = self._set
+        new = set()
+        for iterable in iterables:
+            new.update(iterable)
+        new.difference_update(keys)
+        keys.update(new)
+        self._list.update(new)
+
+    def clear(self):
+        self._set.clear()
+        self._list.clear()
+
+    def __getitem__(self, index):
+        """Returns the key at `index`. Slicing returns a new SortedSet."""
+        if isinstance(index, slice):
+            return self._from_sorted(self._list[index], self._list._load)
+        return self._list[index]
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            keys = self._list[index]
+        else:
+            keys = [self._list[index]]
+        del self._list[index]
+        self._set.difference_update(keys)
+
+    def index(self, key):
+        if key not in self._set:
+            raise ValueError('{!r} is not in set'.format(key))
+        return self._list.bisect_left(key)
+
+    def pop(self, index=-1):
+        """Removes and returns the key at `index`, by default the largest
+        one."""
+        if not self._set:
+            raise KeyError('set is empty')
+        key = self._list.pop(index)
+        self._set.remove(key)
+        return key
+
+    def bisect_left(self, key):
+        return self._list.bisect_left(key)
+
+    def bisect_right(self, key):
+        return self._list.bisect_right(key)
+
+    bisect = bisect_right
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, True),
+        reverse=False):
+        """Iterates over keys between `minimum` and `maximum`. See
+        :meth:`SortedList.irange`."""
+        return self._list.irange(minimum, maximum, inclusive, reverse)
+
+    def copy(self):
+        return self._from_sorted(list(self._list), self._list._load)
+
+    __copy__ = copy
+
+    def union(self, *others):
+        result = self.copy()
+        result.update(*others)
+        return result
+
+    def intersection(self, *others):
+        keys = self._set.intersection(*others)
+        return self._from_sorted([k for k in self._list if k in keys],
+            self._list._load)
+
+    def difference(self, *others):
+        keys = self._set.difference(*others)
+        return self._from_sorted([k for k in self._list if k in keys],
+            self._list._load)
+
+    def symmetric_difference(self, other):
+        return self._from_sorted(sorted(self._set.symmetric_difference(other)),
+            self._list._load)
+
+    def _replace(self, other):
+        self._set = other._set
+        self._list = other._list
+
+    def intersection_update(self, *others):
+        self._replace(self.intersection(*others))
+
+    def difference_update(self, *others):
+        self._replace(self.difference(*others))
+
+    def symmetric_difference_update(self, other):
+        self._replace(self.symmetric_difference(other))
+
+    def issubset(self, other):
+        return self._set.issubset(other)
+
+    def issuperset(self, other):
+        return self._set.issuperset(other)
+
+    def __or__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.union(other)
+
+    def __and__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.difference(other)
+
+    def __xor__(self, other):
+        if not isinstance(other, collections.Iterable):
+            return NotImplemented
+        return self.symmetric_difference(other)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def __eq__(self, other):
+        if isinstance(other, SortedSet):
+            return self._set == other._set
+        if isinstance(other, collections.Set):
+            return len(self) == len(other) and self._set.issubset(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __reduce__(self):
+        return self.__class__, (list(self._list), self._list._load)
+
+    def __repr__(self):
+        if not self:
+            return '%s()' % (self.__class__.__name__,)
+        return '%s(%r)' % (self.__class__.__name__, list(self))
+
+
+class SortedDict(dict):
+    """A dictionary iterating over its keys in sorted order. Lookups take
+    O(1) time, insertion, deletion and positional access O(log n)."""
+
+    def __init__(self, *args, **kwargs):
+        load = kwargs.pop('load', DEFAULT_LOAD)
+        dict.__init__(self)
+        self._list = SortedList(load=load)
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._list.add(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._list.discard(key)
+
+    def update(self, *args, **kwargs):
+        if len(args) > 1:
+            raise TypeError('update expected at most 1 arguments, got '
+                '{}'.format(len(args)))
+        if not self:
+            dict.update(self, *args, **kwargs)
+            self._list.update(dict.iterkeys(self))
+            return
+        items = dict(*args, **kwargs)
+        if 4 * len(items) >= len(self):
+            dict.update(self, items)
+            self._list.clear()
+            self._list.update(dict.iterkeys(self))
+            return
+        for key, value in items.iteritems():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    _missing = object()
+
+    def pop(self, key, default=_missing):
+        if key in self:
+            self._list.discard(key)
+            return dict.pop(self, key)
+        if default is self._missing:
+            raise KeyError(key)
+        return default
+
+    def popitem(self, index=-1):
+        """Removes and returns the ``(key, value)`` pair at `index`, by
+        default the one with the largest key."""
+        if not self:
+            raise KeyError('dictionary is empty')
+        key = self._list.pop(index)
+        return key, dict.pop(self, key)
+
+    def clear(self):
+        dict.clear(self)
+        self._list.clear()
+
+    def __iter__(self):
+        return iter(self._list)
+
+    def __reversed__(self):
+        return reversed(self._list)
+
+    iterkeys = __iter__
+
+    def itervalues(self):
+        getitem = dict.__getitem__
+        return (getitem(self, key) for key in self._list)
+
+    def iteritems(self):
+        getitem = dict.__getitem__
+        return ((key, getitem(self, key)) for key in self._list)
+
+    def keys(self):
+        return list(self._list)
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def peekitem(self, index=-1):
+        """Returns the ``(key, value)`` pair at `index`, by default the one
+        with the largest key."""
+        key = self._list[index]
+        return key, dict.__getitem__(self, key)
+
+    def index(self, key):
+        """Returns the position of `key` among the sorted keys."""
+        if key not in self:
+            raise ValueError('{!r} is not in dict'.format(key))
+        return self._list.bisect_left(key)
+
+    def bisect_left(self, key):
+        return self._list.bisect_left(key)
+
+    def bisect_right(self, key):
+        return self._list.bisect_right(key)
+
+    bisect = bisect_right
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, True),
+        reverse=False):
+        """Iterates over keys between `minimum` and `maximum`. See
+        :meth:`SortedList.irange`."""
+        return self._list.irange(minimum, maximum, inclusive, reverse)
+
+    def copy(self):
+        return self.__class__(self.iteritems(), load=self._list._load)
+
+    __copy__ = copy
+
+    @classmethod
+    def fromkeys(cls, iterable, value=None):
+        return cls((key, value) for key in iterable)
+
+    def __reduce__(self):
+        return self.__class__, (self.items(),)
+
+    def __repr__(self):
+        return '%s({%s})' % (self.__class__.__name__, ', '.join('%r: %r'
+            % item for item in self.iteritems()))
@@ -31,4 +31,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from .synchronization import synchronized
+from .synchronization import synchronized, SharedMemoryLock
+from .limiting import limit, rate_limited, LimitExceeded
+from .batching import batched
+from .parallel import pmap
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""lck.concurrency.batching
+   ------------------------
+
+   Implements a decorator coalescing concurrent single-item calls into bulk
+   calls. The first thread calling the decorated function opens a batch and
+   waits a short time for other threads to join it (or until the batch is
+   full). Then it invokes the bulk function once on behalf of everybody and
+   hands each caller its own result. No background threads are involved."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from threading import Event, Lock
+from functools import wraps
+
+
+class _Batch(object):
+    __slots__ = ('items', 'results', 'error', 'full', 'done')
+
+    def __init__(self):
+        self.items = []
+        self.results = None
+        self.error = None
+        self.full = Event()
+        self.done = Event()
+
+    def run(self, func):
+        try:
+            results = list(func(self.items))
+            if len(results) != len(self.items):
+                raise ValueError("{}() returned {} results for {} items."
+                    "".format(func.__name__, len(results), len(self.items)))
+            self.results = results
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+    def result(self, index):
+        if self.error is not None:
+            raise self.error
+        result = self.results[index]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+def batched(func=None, max_size=100, window=0.005):
+    """Request coalescing decorator. Decorates a bulk function taking a list
+    of items and returning a sequence of results in the same order. The
+    decorated function takes a single item and returns its single result::
+
+        @batched(max_size=50)
+        def fetch(ids):
+            return db.get_many(ids)
+
+        fetch(1)
+
+    When the bulk function raises an exception, every caller in the batch
+    gets it. If the returned sequence holds an exception instance, it is
+    raised only in the call which passed the corresponding item. The original
+    bulk function is available as the ``bulk`` attribute of the wrapper.
+
+        :param max_size: the maximum number of items in a single bulk call.
+               When a batch is full it is run immediately.
+        :param window: time in seconds the first caller waits for other
+               threads to join its batch. Larger values mean larger batches
+               but longer latency of every call.
+    """
+
+    # the decorator can be used with an argument as well as without any
+    if func is None:
+        def wrapper(f):
+            return batched(f, max_size=max_size, window=window)
+        return wrapper
+
+    lock = Lock()
+    pending = [None]        # the batch currently accepting items
+
+    @wraps(func)
+    def wrapper(item):
+        with lock:
+            batch = pending[0]
+            leader = batch is None
+            if leader:
+                batch = pending[0] = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if index + 1 >= max_size:
+                pending[0] = None
+                batch.full.set()
+        if leader:
+            batch.full.wait(window)
+            with lock:
+                if pending[0] is batch:
+                    pending[0] = None
+            batch.run(func)
+        else:
+            batch.done.wait()
+        return batch.result(index)
+
+    wrapper.bulk = func
+    return wrapper
@@ -0,0 +1,314 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""lck.concurrency.limiting
+   ------------------------
+
+   Implements decorators limiting how the specified functions are called.
+
+   :func:`limit` caps the number of concurrent calls. Within a single process
+   a counting semaphore is used. Across processes, the limit is enforced by
+   a set of slot files locked with ``flock()``. A slot held by a process that
+   died is freed automatically by the operating system.
+
+   :func:`rate_limited` caps the number of calls per second using a token
+   bucket. Across processes, the bucket lives in a memory-mapped file guarded
+   by the same kind of lock :func:`synchronized` would use."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mmap
+import os
+import struct
+from threading import Condition, Lock
+from time import time, sleep
+from functools import wraps
+
+from .synchronization import ProcessFileLock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class LimitExceeded(Exception):
+    """Raised when a call of a limited function is rejected because it could
+    not proceed in time (or at all, when not blocking)."""
+
+
+class Semaphore(object):
+    """A counting semaphore which, unlike the one in :mod:`threading`,
+    supports timeouts on :meth:`acquire`."""
+
+    def __init__(self, value=1):
+        if value < 1:
+            raise ValueError('Semaphore value must be positive.')
+        self._cond = Condition(Lock())
+        self._value = value
+
+    def acquire(self, blocking=True, timeout=None):
+        with self._cond:
+            if not self._value:
+                if not blocking:
+                    return False
+                if timeout is None:
+                    while not self._value:
+                        self._cond.wait()
+                else:
+                    end_time = time() + timeout
+                    while not self._value:
+                        remaining = end_time - time()
+                        if remaining <= 0:
+                            return False
+                        self._cond.wait(remaining)
+            self._value -= 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._value += 1
+            self._cond.notify()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class FileSemaphore(object):
+    """A counting semaphore shared by all processes on a host. Each of the
+    ``value`` slots is a file named ``path.N``, a slot is taken by holding
+    an exclusive ``flock()`` on its file. Every acquisition opens its own file
+    descriptor so threads within a process are counted as well.
+
+    Available on POSIX systems only."""
+
+    poll_interval = 0.01
+
+    def __init__(self, path, value=1):
+        if fcntl is None:
+            raise NotImplementedError('File semaphores require fcntl.')
+        if value < 1:
+            raise ValueError('Semaphore value must be positive.')
+        self.path = path
+        self.value = value
+        self._held = []
+        self._held_lock = Lock()
+
+    def _try_acquire(self):
+        for slot in xrange(self.value):
+            fd = os.open('{}.{}'.format(self.path, slot),
+                os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                os.close(fd)
+                continue
+            with self._held_lock:
+                self._held.append(fd)
+            return True
+        return False
+
+    def acquire(self, blocking=True, timeout=None):
+        if self._try_acquire():
+            return True
+        if not blocking:
+            return False
+        end_time = None if timeout is None else time() + timeout
+        interval = self.poll_interval
+        while True:
+            if end_time is not None:
+                remaining = end_time - time()
+                if remaining <= 0:
+                    return False
+                interval = min(interval, remaining)
+            sleep(interval)
+            if self._try_acquire():
+                return True
+            # back off up to 10 times the base interval
+            interval = min(2 * interval, 10 * self.poll_interval)
+
+    def release(self):
+        with self._held_lock:
+            fd = self._held.pop()
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def limit(n, semaphore=None, path=None, timeout=None, blocking=True):
+    """Concurrency limiting decorator. At most `n` calls of the decorated
+    function run at the same time, the rest waits for a free slot.
+
+        :param n: the maximum number of concurrent calls.
+        :param semaphore: the user can specify a concrete semaphore object to
+               be used with this specific decorator. This is useful when
+               a group of functions should share a single limit. Any object
+               with ``acquire(blocking, timeout)`` and ``release()`` methods
+               will do, e.g. a :class:`multiprocessing.BoundedSemaphore`
+               inherited by forked workers. `n` is ignored in that case.
+        :param path: instead of a threading-based semaphore, a set of `n`
+               slot files with the given path as a prefix is used. The limit
+               is then enforced across all processes on the host.
+        :param timeout: maximum time in seconds a call waits for a free slot.
+               When it passes, :exc:`LimitExceeded` is raised. ``None`` (the
+               default) means waiting indefinitely.
+        :param blocking: if ``False``, a call which cannot get a slot right
+               away is rejected immediately with :exc:`LimitExceeded`. Useful
+               to shed load instead of piling up blocked threads in front of
+               an overloaded backend.
+    """
+    if semaphore is not None:
+        _semaphore = semaphore
+    elif path is not None:
+        _semaphore = FileSemaphore(path, n)
+    else:
+        _semaphore = Semaphore(n)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _semaphore.acquire(blocking, timeout):
+                raise LimitExceeded("No free slot for {}() (limit: {})."
+                    "".format(func.__name__, n))
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _semaphore.release()
+        return wrapper
+    return decorator
+
+
+class TokenBucket(object):
+    """A token bucket refilled with `rate` tokens per second, holding at most
+    `burst` tokens (by default: `rate`, allowing a one second burst).
+
+    If `path` is given, the bucket is shared by all processes using the same
+    path: its state is kept in a memory-mapped file. The state is guarded by
+    `lock` if given. Otherwise the lock is file-based when `path` is given,
+    threading-based otherwise. For high rates pass a
+    :class:`SharedMemoryLock`."""
+
+    _state = struct.Struct(b'<dd')     # tokens, timestamp of last update
+
+    def __init__(self, rate, burst=None, path=None, lock=None):
+        if rate <= 0:
+            raise ValueError('Rate must be positive.')
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self.path = path
+        if path is None:
+            self._lock = lock if lock else Lock()
+            self._memory = None
+            self._tokens = self.burst
+            self._timestamp = time()
+        else:
+            self._lock = lock if lock else ProcessFileLock(path)
+            self._memory = self._map_state(path)
+
+    def _map_state(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._lock:
+                if os.fstat(fd).st_size < self._state.size:
+                    os.write(fd, self._state.pack(self.burst, time()))
+            return mmap.mmap(fd, self._state.size)
+        finally:
+            os.close(fd)
+
+    def _take(self, tokens):
+        """Takes `tokens` from the bucket if possible. Returns the time in
+        seconds after which enough of them should be available."""
+        with self._lock:
+            if self._memory is None:
+                available, timestamp = self._tokens, self._timestamp
+            else:
+                available, timestamp = self._state.unpack_from(self._memory)
+            now = time()
+            available = min(self.burst,
+                available + max(0, now - timestamp) * self.rate)
+            missing = tokens - available
+            if missing <= 0:
+                available -= tokens
+            if self._memory is None:
+                self._tokens, self._timestamp = available, now
+            else:
+                self._state.pack_into(self._memory, 0, available, now)
+        return max(0, missing / self.rate)
+
+    def acquire(self, tokens=1, blocking=True, timeout=None):
+        """Takes `tokens` from the bucket, waiting until they're available
+        if `blocking` is ``True``. Returns ``False`` if the tokens couldn't
+        be taken without blocking or within `timeout` seconds."""
+        if tokens > self.burst:
+            raise ValueError('Cannot take more tokens than the burst size.')
+        end_time = None if timeout is None else time() + timeout
+        while True:
+            wait = self._take(tokens)
+            if not wait:
+                return True
+            if not blocking:
+                return False
+            if end_time is not None and time() + wait > end_time:
+                return False
+            sleep(wait)
+
+
+def rate_limited(rate, burst=None, path=None, lock=None, timeout=None,
+    blocking=True):
+    """Rate limiting decorator. The decorated function is called at most
+    `rate` times per second on average, with bursts of up to `burst` calls.
+    Calls exceeding the rate wait until they fit in.
+
+        :param rate: the number of calls per second.
+        :param burst: the maximum number of calls that can be made at once
+               after a period of inactivity. Defaults to `rate`.
+        :param path: if given, the limit is shared by all processes using the
+               same path. See :class:`TokenBucket`.
+        :param lock: the lock guarding the shared state, used even if `path`
+               is given. See :class:`TokenBucket`.
+        :param timeout: maximum time in seconds a call waits. When it would be
+               exceeded, :exc:`LimitExceeded` is raised right away.
+        :param blocking: if ``False``, a call exceeding the rate is rejected
+               immediately with :exc:`LimitExceeded`.
+    """
+    bucket = TokenBucket(rate, burst, path=path, lock=lock)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not bucket.acquire(1, blocking, timeout):
+                raise LimitExceeded("Rate limit of {}() exceeded ({}/s)."
+                    "".format(func.__name__, rate))
+            return func(*args, **kwargs)
+        wrapper.bucket = bucket
+        return wrapper
+    return decorator
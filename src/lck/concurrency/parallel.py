@@ -0,0 +1,143 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""lck.concurrency.parallel
+   ------------------------
+
+   A parallel ``map()`` running on a pool of threads or processes. Unlike
+   :meth:`multiprocessing.Pool.imap`, the input is consumed lazily: only
+   a bounded number of chunks is in flight at any time so memory usage stays
+   flat no matter how long the input is."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from itertools import islice
+from multiprocessing import cpu_count
+from multiprocessing.pool import Pool, ThreadPool
+from Queue import Empty, Queue
+from time import time
+
+# auto-tuned chunks aim to take this long to process, in seconds
+CHUNK_DURATION = 0.05
+MAX_CHUNKSIZE = 4096
+# how often chunks that failed without a callback are looked for, in seconds
+POLL_INTERVAL = 0.05
+
+
+def _run_chunk(func, chunk):
+    start = time()
+    try:
+        results = [func(item) for item in chunk]
+    except Exception as e:
+        return False, e, 0
+    return True, results, time() - start
+
+
+def pmap(func, iterable, workers=None, mode='thread', chunksize=None,
+    ordered=True):
+    """pmap(func, iterable, [workers, mode, chunksize, ordered]) -> iterator
+
+    Lazily applies `func` to every item of `iterable` on a pool of workers.
+    The first exception raised by `func` is re-raised in the caller as soon
+    as it arrives, the remaining work is then cancelled.
+
+        :param workers: the number of worker threads or processes. Defaults
+               to the number of CPUs.
+        :param mode: ``'thread'`` (the default) or ``'process'``. In the
+               latter case `func`, the items and the results must be
+               picklable.
+        :param chunksize: the number of items sent to a worker at once. By
+               default it's tuned automatically so that a chunk takes about
+               :data:`CHUNK_DURATION` seconds to process.
+        :param ordered: if ``True`` (the default), results are yielded in
+               input order. Otherwise they are yielded as soon as they are
+               computed, like :meth:`multiprocessing.Pool.imap_unordered`.
+    """
+    if mode not in ('thread', 'process'):
+        raise ValueError("Unknown mode: {!r}.".format(mode))
+    if workers is None:
+        workers = cpu_count()
+    pool_class = ThreadPool if mode == 'thread' else Pool
+    return _pmap(pool_class, func, iter(iterable), workers, chunksize,
+        ordered)
+
+
+def _pmap(pool_class, func, iterator, workers, chunksize, ordered):
+    pool = pool_class(workers)
+    # the callback only fires for chunks that come back successfully, a task
+    # or a result that cannot be pickled never calls it. It is therefore just
+    # a wake-up signal, completion is always checked on the results.
+    wakeup = Queue()
+    max_in_flight = 2 * workers
+    pending = {}
+    submitted = 0
+    next_index = 0
+    finished = {}
+    exhausted = False
+    size = chunksize or 1
+    try:
+        while True:
+            # chunks waiting in `finished` for an earlier one still count
+            while len(pending) + len(finished) < max_in_flight and \
+                not exhausted:
+                chunk = list(islice(iterator, size))
+                if not chunk:
+                    exhausted = True
+                    break
+                pending[submitted] = len(chunk), pool.apply_async(_run_chunk,
+                    (func, chunk), callback=lambda r: wakeup.put(None))
+                submitted += 1
+            if not pending:
+                break
+            ready = sorted(index for index, (_, result) in pending.iteritems()
+                if result.ready())
+            if not ready:
+                try:
+                    wakeup.get(timeout=POLL_INTERVAL)
+                except Empty:
+                    pass
+                continue
+            for index in ready:
+                count, result = pending.pop(index)
+                # re-raises pickling errors of the task or of the result
+                success, results, elapsed = result.get()
+                if not success:
+                    raise results
+                if not chunksize and elapsed:
+                    size = max(1, min(MAX_CHUNKSIZE,
+                        int(CHUNK_DURATION * count / elapsed)))
+                if not ordered:
+                    for item in results:
+                        yield item
+                    continue
+                finished[index] = results
+                while next_index in finished:
+                    for item in finished.pop(next_index):
+                        yield item
+                    next_index += 1
+    finally:
+        pool.terminate()
+        pool.join()
@@ -31,18 +31,72 @@
 
    For filesystem-based locks the module is using Skip Montanaro's
    `lockfile <http://pypi.python.org/pypi/lockfile>`_ library,
-   compatible with Windows and POSIX environments."""
+   compatible with Windows and POSIX environments.
+
+   For hot critical sections shared between processes there is also
+   :class:`SharedMemoryLock`, a named POSIX semaphore. Its uncontended
+   acquisition and release happen in user space."""
 
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import ctypes
+import ctypes.util
+import errno
+import os
 import sys
-from threading import RLock
+from threading import Lock, RLock
+from time import time, sleep
 from lockfile import FileLock
 from functools import wraps
 
+
+class ProcessFileLock(object):
+    """A file-based lock which is also safe to share between threads.
+
+    A ``lockfile.FileLock`` instance derives the name of its lock file
+    from the thread which created it, so two threads sharing one instance
+    both believe they hold it. Here threads are serialized with a regular
+    lock first and only then compete for the file lock with other
+    processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = Lock()
+        self._file_lock = FileLock(path)
+
+    def acquire(self, timeout=None):
+        self._thread_lock.acquire()
+        try:
+            self._file_lock.acquire(timeout=timeout)
+        except:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        try:
+            self._file_lock.release()
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def _make_lock(lock=None, path=None):
+    """Returns the lock described by the `lock` and `path` arguments
+    in the way :func:`synchronized` understands them."""
+    if path is not None:
+        return ProcessFileLock(path)
+    return lock if lock else RLock()
+
+
 def synchronized(func=None, lock=None, path=None):
     """ Synchronization decorator.
 
@@ -58,13 +112,10 @@ def synchronized(func=None, lock=None, path=None):
     # the decarator can be used with an argument as well as without any
     if func is None:
         def wrapper(f):
-            return synchronized(f, lock=lock)
+            return synchronized(f, lock=lock, path=path)
         return wrapper
 
-    if path is None:
-        _lock = lock if lock else RLock()
-    else:
-        _lock = FileLock(path)
+    _lock = _make_lock(lock, path)
 
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -73,3 +124,136 @@ def synchronized(func=None, lock=None, path=None):
         return result
 
     return wrapper
+
+class _timespec(ctypes.Structure):
+    _fields_ = [(b'tv_sec', ctypes.c_long), (b'tv_nsec', ctypes.c_long)]
+
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        for name in ('c', 'pthread', 'rt'):
+            path = ctypes.util.find_library(name)
+            if not path:
+                continue
+            lib = ctypes.CDLL(path, use_errno=True)
+            if hasattr(lib, 'sem_open'):
+                break
+        else:
+            raise NotImplementedError('POSIX named semaphores unavailable.')
+        lib.sem_open.restype = ctypes.c_void_p
+        lib.sem_open.argtypes = [ctypes.c_char_p, ctypes.c_int,
+            ctypes.c_uint, ctypes.c_uint]
+        for func in ('sem_wait', 'sem_trywait', 'sem_post', 'sem_close'):
+            getattr(lib, func).argtypes = [ctypes.c_void_p]
+        lib.sem_unlink.argtypes = [ctypes.c_char_p]
+        if hasattr(lib, 'sem_timedwait'):
+            lib.sem_timedwait.argtypes = [ctypes.c_void_p,
+                ctypes.POINTER(_timespec)]
+        _libc = lib
+    return _libc
+
+
+def _oserror():
+    code = ctypes.get_errno()
+    return OSError(code, errno.errorcode.get(code, 'unknown error'))
+
+
+class SharedMemoryLock(object):
+    """A non-reentrant lock shared by all processes on a host, backed by
+    a named POSIX semaphore living in shared memory. On Linux acquiring
+    a free lock and releasing a lock nobody waits for doesn't enter the
+    kernel at all, only waiting under contention does. All instances created
+    with the same `name` refer to the same lock, no matter which process
+    created them. Instances survive ``fork()`` and can be pickled.
+
+    Just like file-based locks, the lock is not released if the process
+    holding it dies. The semaphore persists until :meth:`unlink` is called
+    or the host reboots.
+
+    Usage::
+
+        LOCK = SharedMemoryLock('myapp-counter')
+
+        @synchronized(lock=LOCK)
+        def increment():
+            pass
+    """
+
+    poll_interval = 0.001
+
+    def __init__(self, name):
+        self.name = name
+        self._sem_name = ('/' + name.lstrip('/')).encode('ascii')
+        self._lib = _load_libc()
+        handle = self._lib.sem_open(self._sem_name, os.O_CREAT, 0o600, 1)
+        if handle in (None, 0, ctypes.c_void_p(-1).value):
+            raise _oserror()
+        self._sem = handle
+
+    def acquire(self, blocking=True, timeout=None):
+        sem = self._sem
+        if sem is None:
+            raise ValueError("lock is closed")
+        lib = self._lib
+        if lib.sem_trywait(sem) == 0:
+            return True
+        if ctypes.get_errno() != errno.EAGAIN:
+            raise _oserror()
+        if not blocking:
+            return False
+        if timeout is None:
+            while lib.sem_wait(sem):
+                if ctypes.get_errno() != errno.EINTR:
+                    raise _oserror()
+            return True
+        end_time = time() + timeout
+        if hasattr(lib, 'sem_timedwait'):
+            sec = int(end_time)
+            deadline = _timespec(sec, int((end_time - sec) * 1e9))
+            while lib.sem_timedwait(sem, ctypes.byref(deadline)):
+                code = ctypes.get_errno()
+                if code == errno.ETIMEDOUT:
+                    return False
+                if code != errno.EINTR:
+                    raise _oserror()
+            return True
+        # no sem_timedwait (e.g. on OS X), poll
+        while time() < end_time:
+            sleep(self.poll_interval)
+            if lib.sem_trywait(sem) == 0:
+                return True
+        return False
+
+    def release(self):
+        sem = self._sem
+        if sem is None:
+            raise ValueError("lock is closed")
+        if self._lib.sem_post(sem):
+            raise _oserror()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def close(self):
+        """Detaches this instance from the semaphore. It cannot be used
+        afterwards."""
+        if self._sem is not None:
+            self._lib.sem_close(self._sem)
+            self._sem = None
+
+    def unlink(self):
+        """Removes the semaphore name from the system. Processes which already
+        opened it can still use it, new instances create a fresh lock."""
+        if self._lib.sem_unlink(self._sem_name):
+            raise _oserror()
+
+    def __reduce__(self):
+        return self.__class__, (self.name,)
+
+    def __repr__(self):
+        return '<{} {!r}>'.format(self.__class__.__name__, self.name)
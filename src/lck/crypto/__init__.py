@@ -39,7 +39,7 @@ from Crypto.Cipher import CAST as _CAST
 from Crypto.Cipher import DES as _DES
 from Crypto.Cipher import DES3 as _DES3
 
-from .cipher import Cipher
+from .cipher import Cipher, CipherPool
 
 def _setup_cipher(cipher):
     part = partial(Cipher, cipher=cipher)
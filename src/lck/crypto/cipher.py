@@ -32,15 +32,27 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from base64 import b64encode, b64decode
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+from hashlib import sha256
+import hmac
+from importlib import import_module
+import errno
 import os
 import random
 import stat
 import string
 import tempfile
 
-from lck.concurrency import synchronized
+from Crypto.Util import Counter
+
+from lck.concurrency import pmap, synchronized
 
 ALPHABET = string.letters + string.digits + string.punctuation
+CHUNK_SIZE = 65536
+CTR_CHUNK_SIZE = 4 * 1024 * 1024
+CTR_MAGIC = b'lck-ctr\x01'
 
 
 class Cipher(object):
@@ -55,26 +67,41 @@ class Cipher(object):
         if key is None:
             if path is None:
                 raise ValueError('Either `key` or `path` must be provided.')
-            length = 32 if not cipher.key_size else cipher.key_size
+            length = cipher.key_size or 32
+            if not isinstance(length, int):
+                length = max(length)
             key = self.key_from_path(path, create, length)
+        self._key = key
+        self._algorithm = cipher
         self._cipher = cipher.new(key)
         self.block = self._cipher.block_size
 
     @staticmethod
-    @synchronized(path=os.path.join(tempfile.gettempdir(),
-        'lck-crypto-cipher.lock'))
     def key_from_path(path, create=True, length=32):
-        if not os.path.exists(path):
+        """Returns the key stored in the file under ``path``. If the file is
+        absent and ``create`` is True, it is created with a random key of
+        ``length`` characters.
+
+        Keys are cached in-process. A cached key is used as long as the
+        inode and modification time of the file stay the same. The global
+        lock is only taken when the file has to be created."""
+        try:
+            status = os.stat(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
             if not create:
                 raise IOError("File does not exist: {}".format(path))
-            else:
-                with open(path, "wb") as key_file:
-                    key_file.write(''.join([random.choice(ALPHABET)
-                        for i in range(length)]))
-                    key_file.flush()
-                    os.fchmod(key_file.fileno(), stat.S_IRUSR)
+            _create_key_file(path, length)
+            status = os.stat(path)
+        cached = _keys.get(path)
+        if cached and cached[:2] == (status.st_ino, status.st_mtime):
+            return cached[2]
         with open(path, "rb") as key_file:
-            return key_file.read()
+            status = os.fstat(key_file.fileno())
+            key = key_file.read()
+        _keys[path] = status.st_ino, status.st_mtime, key
+        return key
 
     def encrypt(self, buffer, base64=False):
         """Encrypts the specified ``buffer``, optionally encoding the result to
@@ -102,19 +129,424 @@ class Cipher(object):
         result = self._depad_buffer(self._cipher.decrypt(buffer))
         return result
 
+    def encrypt_many(self, buffers, base64=False):
+        """Encrypts each of the specified ``buffers``, optionally encoding the
+        results to Base64. Returns a list of results, the same as calling
+        :meth:`encrypt` for each buffer would.
+
+        All buffers are padded and encrypted in a single call to the
+        underlying cipher which makes this much faster for many small
+        buffers. This works because the electronic codebook mode used by
+        Cipher encrypts every block independently."""
+        buffers = list(buffers)
+        for buffer in buffers:
+            assert isinstance(buffer, bytes), "Cannot encrypt {} instances. "\
+                "Encode to bytes first.".format(buffer.__class__.__name__)
+        pads = [self.block - len(buffer) % self.block for buffer in buffers]
+        # randomness for all the padding is drawn at once
+        randomness = os.urandom(sum(pads))
+        padded = []
+        offset = 0
+        for buffer, pad_bytes in zip(buffers, pads):
+            end = offset + pad_bytes
+            padded.append(self._pad_buffer(buffer, randomness[offset:end]))
+            offset = end
+        result = self._cipher.encrypt(b''.join(padded))
+        results = []
+        offset = 0
+        for buffer in padded:
+            end = offset + len(buffer)
+            results.append(result[offset:end])
+            offset = end
+        if base64:
+            results = [b64encode(result) for result in results]
+        return results
+
+    def decrypt_many(self, buffers, base64=False):
+        """Decrypts each of the specified ``buffers``, optionally decoding
+        them from Base64 first. Returns a list of results, the same as
+        calling :meth:`decrypt` for each buffer would. All buffers are
+        decrypted in a single call to the underlying cipher."""
+        if base64:
+            buffers = [b64decode(buffer) for buffer in buffers]
+        else:
+            buffers = list(buffers)
+        for buffer in buffers:
+            assert isinstance(buffer, bytes), "Cannot decrypt {} instances. "\
+                "Encode to bytes first.".format(buffer.__class__.__name__)
+            if not buffer or len(buffer) % self.block:
+                raise ValueError("Input length must be a multiple of {} "
+                    "bytes.".format(self.block))
+        result = self._cipher.decrypt(b''.join(buffers))
+        results = []
+        offset = 0
+        for buffer in buffers:
+            end = offset + len(buffer)
+            pad_bytes = ord(result[end - 1]) % self.block or self.block
+            results.append(result[offset:end - pad_bytes])
+            offset = end
+        return results
+
+    def encrypt_stream(self, src, dst, chunk_size=CHUNK_SIZE, base64=False):
+        """Encrypts everything read from the file-like object ``src``,
+        writing the result to ``dst``, optionally encoded to Base64. The
+        result is the same as for :meth:`encrypt` on the whole content.
+
+        Data is processed in chunks of about ``chunk_size`` bytes so memory
+        usage doesn't depend on the size of the input."""
+        chunks = self._encrypted_chunks(src, chunk_size)
+        if base64:
+            chunks = _base64_chunks(chunks)
+        for chunk in chunks:
+            dst.write(chunk)
+
+    def decrypt_stream(self, src, dst, chunk_size=CHUNK_SIZE, base64=False):
+        """Decrypts everything read from the file-like object ``src``,
+        optionally decoding from Base64 first, writing the result to
+        ``dst``. The result is the same as for :meth:`decrypt` on the whole
+        content.
+
+        Data is processed in chunks of about ``chunk_size`` bytes so memory
+        usage doesn't depend on the size of the input."""
+        chunks = _read_chunks(src, chunk_size)
+        if base64:
+            chunks = _unbase64_chunks(chunks)
+        for chunk in self._decrypted_chunks(chunks):
+            dst.write(chunk)
+
+    def _encrypted_chunks(self, src, chunk_size):
+        rest = b''
+        for chunk in _read_chunks(src, chunk_size):
+            if rest:
+                chunk = rest + chunk
+            # padding only depends on the length of the final, incomplete
+            # block so everything before it can be encrypted right away
+            aligned = len(chunk) - len(chunk) % self.block
+            rest = chunk[aligned:]
+            if aligned:
+                yield self._cipher.encrypt(chunk[:aligned])
+        yield self._cipher.encrypt(self._pad_buffer(rest))
+
+    def _decrypted_chunks(self, chunks):
+        rest = b''
+        for chunk in chunks:
+            if rest:
+                chunk = rest + chunk
+            # the last block is kept until it's known whether it's the
+            # final, padded one
+            aligned = len(chunk) - len(chunk) % self.block
+            if aligned == len(chunk):
+                aligned -= self.block
+            rest = chunk[aligned:]
+            if aligned > 0:
+                yield self._cipher.decrypt(chunk[:aligned])
+        if len(rest) != self.block:
+            raise ValueError("Input length must be a multiple of {} bytes."
+                "".format(self.block))
+        yield self._depad_buffer(self._cipher.decrypt(rest))
+
+    def encrypted_size(self, length):
+        """Returns the size of the encrypted form of ``length`` bytes."""
+        return length - length % self.block + self.block
+
+    def encrypt_into(self, buf, out):
+        """Encrypts ``buf`` (bytes, a bytearray or a memoryview) into
+        ``out``, a preallocated bytearray or writable memoryview of at least
+        :meth:`encrypted_size` bytes. Returns the number of bytes written.
+        The result is the same as for :meth:`encrypt`."""
+        assert not isinstance(buf, unicode), "Cannot encrypt unicode "\
+            "instances. Encode to bytes first."
+        size = len(buf) - len(buf) % self.block + self.block
+        if len(out) < size:
+            raise ValueError("Output buffer too small, {} bytes needed."
+                "".format(size))
+        if not isinstance(buf, bytes):
+            buf = _view(buf)[:]
+        out[:size] = self._cipher.encrypt(self._pad_buffer(buf))
+        return size
+
+    def decrypt_into(self, buf, out):
+        """Decrypts ``buf`` (bytes, a bytearray or a memoryview) into
+        ``out``, a preallocated bytearray or writable memoryview. ``out``
+        never needs to be larger than ``buf``. Returns the number of bytes
+        written. The result is the same as for :meth:`decrypt`."""
+        assert not isinstance(buf, unicode), "Cannot decrypt unicode "\
+            "instances. Encode to bytes first."
+        length = len(buf)
+        if not length or length % self.block:
+            raise ValueError("Input length must be a multiple of {} bytes."
+                "".format(self.block))
+        result = self._cipher.decrypt(_view(buf))
+        pad_bytes = ord(result[-1]) % self.block or self.block
+        size = length - pad_bytes
+        if len(out) < size:
+            raise ValueError("Output buffer too small, {} bytes needed."
+                "".format(size))
+        out[:size] = buffer(result, 0, size)
+        return size
+
+    def encrypt_file(self, src, dst, workers=None, chunk_size=CTR_CHUNK_SIZE):
+        """Encrypts the file under path ``src`` to a new file under path
+        ``dst`` using the counter (CTR) mode, in which every chunk of the
+        file can be processed independently. Chunks of ``chunk_size`` bytes
+        are encrypted on a pool of ``workers`` processes (by default: one
+        per CPU) writing directly at their offsets in ``dst``.
+
+        Every file is encrypted with its own random key, so a keystream is
+        never reused and the key used by :meth:`encrypt` never encrypts
+        a counter block. The result is a small header holding the file key,
+        wrapped with a key derived from this cipher's key, followed by data
+        of the same size as the input. Use :meth:`decrypt_file` or
+        :meth:`decrypt_range` to decrypt it."""
+        file_key = os.urandom(_ctr_key_length(self._algorithm))
+        header = CTR_MAGIC + self._ctr_key_cipher().encrypt(file_key)
+        size = os.path.getsize(src)
+        with open(dst, 'wb') as dst_file:
+            dst_file.write(header)
+            dst_file.truncate(len(header) + size)
+        self._ctr_file(file_key, src, 0, dst, len(header), size, workers,
+            chunk_size)
+
+    def decrypt_file(self, src, dst, workers=None, chunk_size=CTR_CHUNK_SIZE):
+        """Decrypts the file under path ``src`` created by
+        :meth:`encrypt_file` to a new file under path ``dst``. Chunks are
+        decrypted in parallel, see :meth:`encrypt_file`."""
+        with open(src, 'rb') as src_file:
+            file_key = self._read_ctr_header(src_file)
+        header_size = len(CTR_MAGIC) + len(file_key)
+        size = os.path.getsize(src) - header_size
+        with open(dst, 'wb') as dst_file:
+            dst_file.truncate(size)
+        self._ctr_file(file_key, src, header_size, dst, 0, size, workers,
+            chunk_size)
+
+    def decrypt_range(self, path, offset, length):
+        """Returns ``length`` bytes starting at ``offset`` of the plaintext of
+        the file under ``path`` created by :meth:`encrypt_file`. Only the
+        blocks covering the range are read and decrypted."""
+        with open(path, 'rb') as encrypted:
+            file_key = self._read_ctr_header(encrypted)
+            start = offset - offset % self.block
+            encrypted.seek(start, os.SEEK_CUR)
+            data = encrypted.read(offset + length - start)
+        cipher = _ctr_cipher(self._algorithm, file_key, start // self.block)
+        return cipher.decrypt(data)[offset - start:]
+
+    def _read_ctr_header(self, encrypted):
+        """Reads the header written by :meth:`encrypt_file` and returns the
+        unwrapped file key."""
+        size = len(CTR_MAGIC) + _ctr_key_length(self._algorithm)
+        header = encrypted.read(size)
+        if not header.startswith(CTR_MAGIC) or len(header) != size:
+            raise ValueError("Not a file encrypted with encrypt_file().")
+        return self._ctr_key_cipher().decrypt(header[len(CTR_MAGIC):])
+
+    def _ctr_key_cipher(self):
+        """Returns the cipher wrapping file keys. Its key is derived from
+        this cipher's key so that :meth:`encrypt` and :meth:`decrypt` can't
+        be used to unwrap file keys."""
+        length = _ctr_key_length(self._algorithm)
+        key = hmac.new(self._key, b'lck-ctr file key', sha256).digest()
+        return self._algorithm.new(key[:length])
+
+    def _ctr_file(self, file_key, src, src_offset, dst, dst_offset, size,
+        workers, chunk_size):
+        chunk_size = max(self.block, chunk_size - chunk_size % self.block)
+        chunks = [(offset, min(chunk_size, size - offset))
+            for offset in xrange(0, size, chunk_size)]
+        process = partial(_ctr_chunk, self._algorithm.__name__, file_key,
+            src, src_offset, dst, dst_offset)
+        if len(chunks) > 1 and workers != 1:
+            results = pmap(process, chunks, workers=workers, mode='process',
+                chunksize=1)
+        else:
+            results = (process(chunk) for chunk in chunks)
+        for _ in results:
+            pass
+
     # the cipher needs self.block byte blocks to work with
-    def _pad_buffer(self, buffer):
+    def _pad_buffer(self, buffer, padding=None):
         pad_bytes = self.block - (len(buffer) % self.block)
-        for i in range(pad_bytes - 1):
-            buffer += chr(random.randrange(0, 256))
+        if padding is None:
+            padding = os.urandom(pad_bytes)
         # final padding byte; % by self.block to get the number of padding bytes
-        bflag = random.randrange(6, 256 - self.block)
+        bflag = 6 + ord(padding[-1]) % (250 - self.block)
         bflag -= bflag % self.block - pad_bytes
-        buffer += chr(bflag)
-        return buffer
+        return buffer + padding[:-1] + chr(bflag)
 
     def _depad_buffer(self, buffer):
         pad_bytes = ord(buffer[-1]) % self.block
         if not pad_bytes:
             pad_bytes = self.block
         return buffer[:-pad_bytes]
+
+class CipherPool(object):
+    """A pool of :class:`Cipher` instances created by calling ``factory`` with
+    the given arguments, e.g. ``CipherPool(aes, path='/etc/app.key')``.
+
+    A Cipher should not be used by many threads at once. Instead, each
+    thread checks out a cipher from the pool for the duration of the
+    operation. Instances are reused, a new one is only created when all
+    existing ones are in use. Checking out and returning a cipher are single
+    atomic deque operations so threads don't contend on a lock."""
+
+    def __init__(self, factory, *args, **kwargs):
+        self._factory = partial(factory, *args, **kwargs)
+        self._free = deque()
+
+    def acquire(self):
+        """Checks out a cipher from the pool. Pass it to :meth:`release`
+        when done."""
+        try:
+            return self._free.pop()
+        except IndexError:
+            return self._factory()
+
+    def release(self, cipher):
+        """Returns a cipher checked out with :meth:`acquire` to the pool."""
+        self._free.append(cipher)
+
+    @contextmanager
+    def cipher(self):
+        """Context manager checking out a cipher for the enclosed block."""
+        cipher = self.acquire()
+        try:
+            yield cipher
+        finally:
+            self.release(cipher)
+
+    def encrypt(self, buffer, base64=False):
+        """:meth:`Cipher.encrypt` using a cipher from the pool."""
+        cipher = self.acquire()
+        try:
+            return cipher.encrypt(buffer, base64)
+        finally:
+            self.release(cipher)
+
+    def decrypt(self, buffer, base64=False):
+        """:meth:`Cipher.decrypt` using a cipher from the pool."""
+        cipher = self.acquire()
+        try:
+            return cipher.decrypt(buffer, base64)
+        finally:
+            self.release(cipher)
+
+    def encrypt_many(self, buffers, base64=False):
+        """:meth:`Cipher.encrypt_many` using a cipher from the pool."""
+        cipher = self.acquire()
+        try:
+            return cipher.encrypt_many(buffers, base64)
+        finally:
+            self.release(cipher)
+
+    def decrypt_many(self, buffers, base64=False):
+        """:meth:`Cipher.decrypt_many` using a cipher from the pool."""
+        cipher = self.acquire()
+        try:
+            return cipher.decrypt_many(buffers, base64)
+        finally:
+            self.release(cipher)
+
+
+# path -> (inode, modification time, key)
+_keys = {}
+
+
+@synchronized(path=os.path.join(tempfile.gettempdir(),
+    'lck-crypto-cipher.lock'))
+def _create_key_file(path, length):
+    if os.path.exists(path):
+        return
+    # the key is written to a temporary file first and then linked under
+    # `path` so it never appears partially written and an existing file
+    # is never replaced
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+        prefix='.lck-crypto-key-')
+    try:
+        with os.fdopen(fd, "wb") as key_file:
+            key_file.write(''.join([random.choice(ALPHABET)
+                for i in range(length)]))
+            key_file.flush()
+            os.fchmod(key_file.fileno(), stat.S_IRUSR)
+        try:
+            os.link(temp_path, path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+    finally:
+        os.unlink(temp_path)
+
+
+def _ctr_key_length(algorithm):
+    """Returns the length of file keys for `algorithm`: its largest key size
+    up to 256 bits."""
+    sizes = algorithm.key_size or (32,)
+    if isinstance(sizes, int):
+        return sizes
+    return max(size for size in sizes if size <= 32)
+
+
+def _ctr_cipher(algorithm, key, block_index):
+    """Returns a CTR mode cipher starting at block number `block_index`. The
+    counter takes the whole block, `key` must only be used for one file."""
+    counter = Counter.new(8 * algorithm.block_size,
+        initial_value=block_index)
+    return algorithm.new(key, algorithm.MODE_CTR, counter=counter)
+
+
+def _ctr_chunk(algorithm_name, key, src, src_offset, dst, dst_offset,
+    chunk):
+    offset, length = chunk
+    algorithm = import_module(algorithm_name)
+    with open(src, 'rb') as src_file:
+        src_file.seek(src_offset + offset)
+        data = src_file.read(length)
+    cipher = _ctr_cipher(algorithm, key, offset // algorithm.block_size)
+    with open(dst, 'r+b') as dst_file:
+        dst_file.seek(dst_offset + offset)
+        dst_file.write(cipher.encrypt(data))
+
+
+def _view(buf):
+    """Returns `buf` in a form accepted by PyCrypto, without copying unless
+    it's a memoryview."""
+    if isinstance(buf, memoryview):
+        return buf.tobytes()
+    return buffer(buf)
+
+
+def _read_chunks(src, chunk_size):
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _base64_chunks(chunks):
+    """Encodes `chunks` to Base64, splitting them on 3-byte boundaries so
+    that the output is the same as for the joined input."""
+    rest = b''
+    for chunk in chunks:
+        if rest:
+            chunk = rest + chunk
+        aligned = len(chunk) - len(chunk) % 3
+        rest = chunk[aligned:]
+        if aligned:
+            yield b64encode(chunk[:aligned])
+    if rest:
+        yield b64encode(rest)
+
+
+def _unbase64_chunks(chunks):
+    """Decodes Base64 `chunks`, splitting them on 4-character boundaries.
+    Whitespace is ignored."""
+    rest = b''
+    for chunk in chunks:
+        chunk = rest + b''.join(chunk.split())
+        aligned = len(chunk) - len(chunk) % 4
+        rest = chunk[aligned:]
+        if aligned:
+            yield b64decode(chunk[:aligned])
+    if rest:
+        yield b64decode(rest)
@@ -30,4 +30,7 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from .converters import etree_to_dict, decode_entities
+from .converters import etree_to_dict, iter_records, RecordConverter
+from .converters import iter_fields, dict_to_xml
+from .converters import iter_records_parallel, decode_entities
+from .converters import decode_entities_many, iter_decode_entities
@@ -26,36 +26,182 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from datetime import datetime
+from collections import Iterator
+from datetime import datetime, timedelta, tzinfo
 from functools import partial
 from htmlentitydefs import name2codepoint as n2cp
+from itertools import izip, repeat
 import re
+from xml.sax.saxutils import escape, quoteattr
+try:
+    from xml.etree.cElementTree import fromstring, iterparse
+except ImportError:
+    from xml.etree.ElementTree import fromstring, iterparse
+
+from lck.concurrency import pmap
 
 ENTITY_REGEX = re.compile(r'&(#?)(x?)(\d{1,5}|\w{1,8});')
+ENTITY_MAX_LENGTH = 12
+ENTITY_CACHE_SIZE = 65536
+# prefixes of values the default converters can possibly handle
+DATETIME_HINT_REGEX = re.compile(r'\d{4}-\d\d?-\d\d?T', re.I)
+NUMBER_HINT_REGEX = re.compile(r'\s*[-+]?\s*(\d|\.\d|inf|nan)', re.I | re.U)
+
+ISO8601_REGEX = re.compile(r'(\d{4})-(\d\d?)-(\d\d?)T(\d\d?):(\d\d?):(\d\d?)'
+    r'(?:\.(\d+))?(Z|[-+]\d\d(?::?\d\d)?)?\Z', re.I)
+ISO8601_FIXED_REGEX = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d', re.I)
+
+class FixedOffset(tzinfo):
+    """A timezone `minutes` east of UTC."""
+
+    def __init__(self, minutes):
+        self.minutes = minutes
+        self._offset = timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        if not self.minutes:
+            return b'UTC'
+        hours, minutes = divmod(abs(self.minutes), 60)
+        return b'{}{:02d}:{:02d}'.format(b'-' if self.minutes < 0 else b'+',
+            hours, minutes)
+
+    def __repr__(self):
+        return 'FixedOffset({})'.format(self.minutes)
+
+    def __reduce__(self):
+        return FixedOffset, (self.minutes,)
+
+_timezones = {}
+
+def _timezone(designator):
+    """Returns a cached `FixedOffset` for a Z, +HH, +HHMM or +HH:MM UTC
+    offset designator."""
+    try:
+        return _timezones[designator]
+    except KeyError:
+        pass
+    if designator in ('Z', 'z'):
+        minutes = 0
+    else:
+        hours = int(designator[1:3])
+        minutes = int(designator[-2:]) if len(designator) > 3 else 0
+        if hours > 23 or minutes > 59:
+            raise ValueError("Invalid UTC offset: {}".format(designator))
+        minutes += 60 * hours
+        if designator[0] == '-':
+            minutes = -minutes
+    timezone = _timezones[designator] = FixedOffset(minutes)
+    return timezone
 
 def _datetime(value):
-    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+    """Parses ISO 8601 timestamps: YYYY-MM-DDTHH:MM:SS optionally followed
+    by fractional seconds and a UTC offset, which is kept."""
+    if len(value) == 19 and ISO8601_FIXED_REGEX.match(value):
+        # the most common layout, sliced at fixed positions
+        return datetime(int(value[:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:]))
+    match = ISO8601_REGEX.match(value)
+    if match is None:
+        raise ValueError("Not an ISO 8601 timestamp: {!r}".format(value))
+    year, month, day, hour, minute, second, fraction, designator = \
+        match.groups()
+    microsecond = 0
+    if fraction:
+        fraction = fraction[:6]
+        microsecond = int(fraction) * 10 ** (6 - len(fraction))
+    timezone = _timezone(designator) if designator else None
+    return datetime(int(year), int(month), int(day), int(hour), int(minute),
+        int(second), microsecond, timezone)
 
-def _datetime_strip_tz(value):
-    return datetime.strptime(value[:-6], '%Y-%m-%dT%H:%M:%S')
+_converters = _default_converters = [int, float, _datetime]
+_number_converters = _default_converters[:2]
+_datetime_converters = _default_converters[2:]
+_digits = frozenset('0123456789')
 
-_converters = [int, float, _datetime, _datetime_strip_tz]
+def _convert_text(text):
+    """Converts `text` like the default converters would but only calls the
+    ones which can succeed."""
+    if text is None:
+        return text
+    if text[:1] in _digits:
+        if text[4:5] == '-' and DATETIME_HINT_REGEX.match(text):
+            converters = _datetime_converters
+        else:
+            # the most common case, try the cheapest converter right away
+            try:
+                return int(text)
+            except ValueError:
+                pass
+            converters = _number_converters[1:]
+    elif NUMBER_HINT_REGEX.match(text):
+        converters = _number_converters
+    else:
+        return text
+    for converter in converters:
+        try:
+            return converter(text)
+        except (ValueError, TypeError):
+            continue
+    return text
 
-def etree_to_dict(element, namespace="", _converters=_converters):
-    """etree_to_dict(element, [namespace]) -> ("tag_name", dict_with_children)
+def etree_to_dict(element, namespace="", hints=None, _converters=_converters):
+    """etree_to_dict(element, [namespace, hints]) -> ("tag_name",
+    dict_with_children)
 
     `element` must be a valid ElementTree element. `namespace` is optional,
     must be given in Clark notation, e.g. "{ns_uri}".
+
+    Leaf values are converted to integers, floats or datetimes when
+    possible. `hints` is an optional dictionary mapping tag names (without
+    the namespace) to converters used for the given leaves instead, e.g.
+    ``{'zip_code': None, 'price': Decimal}``. ``None`` keeps the text as is.
+
+    The tree is walked iteratively so arbitrarily deep documents are
+    supported.
     """
     if namespace and not element.tag.startswith(namespace):
         return None, None
-    if len(element):
-        response = {}
-        for sub_element in element:
-            tag, value = etree_to_dict(sub_element, namespace=namespace,
-                _converters=_converters)
-            if not tag:
-                continue
+    prefix_length = len(namespace)
+    result = {}
+    # each entry holds an iterator over the children of an element and the
+    # dictionary they're collected in
+    stack = [(iter((element,)), result)]
+    while stack:
+        children, response = stack[-1]
+        for child in children:
+            tag = child.tag
+            if namespace:
+                if not tag.startswith(namespace):
+                    continue
+                tag = tag[prefix_length:]
+            branch = len(child)
+            if branch:
+                value = {}
+                stack.append((iter(child), value))
+            elif hints and tag in hints:
+                value = child.text
+                if hints[tag] is not None:
+                    try:
+                        value = hints[tag](value)
+                    except (ValueError, TypeError):
+                        pass
+            elif _converters is _default_converters:
+                value = _convert_text(child.text)
+            else:
+                value = child.text
+                for converter in _converters:
+                    try:
+                        value = converter(value)
+                    except (ValueError, TypeError):
+                        continue
+                    else:
+                        break
             if tag in response:
                 if isinstance(response[tag], list):
                     response[tag].append(value)
@@ -63,16 +209,579 @@ def etree_to_dict(element, namespace="", _converters=_converters):
                     response[tag] = [response[tag], value]
             else:
                 response[tag] = value
+            if branch:
+                break
+        else:
+            stack.pop()
+    tag = element.tag[prefix_length:]
+    return tag, result[tag]
+
+_SKIP = object()
+
+class _Node(object):
+    """Shape of an element learned by `RecordConverter`."""
+    __slots__ = ('tag', 'branch', 'mixed', 'children', 'kinds')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.branch = None
+        self.mixed = False
+        self.children = {}
+        self.kinds = set()
+
+def _specialized(converter):
+    def convert(text):
+        try:
+            return converter(text)
+        except (ValueError, TypeError):
+            return _convert_text(text)
+    return convert
+
+def _hinted(converter):
+    def convert(text):
+        if converter is None:
+            return text
+        try:
+            return converter(text)
+        except (ValueError, TypeError):
+            return text
+    return convert
+
+_leaf_converters = {
+    'int': _specialized(int),
+    'datetime': _specialized(_datetime),
+}
+
+class RecordConverter(object):
+    """RecordConverter([namespace, hints, samples]) -> converter
+
+    A callable converting repeated elements of the same shape exactly like
+    `etree_to_dict` would. The first `samples` records are converted the
+    generic way while their shape is learned: which tags appear where,
+    which elements are leaves and what type the leaves convert to. Later
+    records are converted using a precomputed dispatch table instead.
+
+    Parts of records which don't match the learned shape (an unseen tag,
+    a leaf where an element with children was expected, etc.) are
+    converted the generic way, so the result never differs from
+    `etree_to_dict`. The number of such fallbacks is kept in the
+    `fallbacks` attribute.
+    """
+
+    def __init__(self, namespace="", hints=None, samples=100):
+        self.namespace = namespace
+        self.hints = hints
+        self.samples = samples
+        self.fallbacks = 0
+        self._seen = 0
+        self._shape = {}
+        self._table = None
+
+    def __call__(self, element):
+        if self._table is None:
+            self._learn(element)
+            self._seen += 1
+            if self._seen >= self.samples:
+                self._table = self._compile(self._shape)
+            return etree_to_dict(element, namespace=self.namespace,
+                hints=self.hints)
+        return self._convert(element)
+
+    def _leaf_kind(self, tag, text):
+        if self.hints and tag in self.hints:
+            return 'hint'
+        value = _convert_text(text)
+        if isinstance(value, (int, long)):
+            return 'int'
+        if isinstance(value, datetime):
+            return 'datetime'
+        return 'other'
+
+    def _learn(self, element):
+        namespace = self.namespace
+        stack = [(element, self._shape)]
+        while stack:
+            element, shape = stack.pop()
+            node = shape.get(element.tag)
+            if node is _SKIP:
+                continue
+            if node is None:
+                if namespace and not element.tag.startswith(namespace):
+                    shape[element.tag] = _SKIP
+                    continue
+                node = shape[element.tag] = _Node(
+                    element.tag[len(namespace):])
+            branch = bool(len(element))
+            if node.branch is None:
+                node.branch = branch
+            elif node.branch != branch:
+                node.mixed = True
+            if branch:
+                stack.extend((child, node.children) for child in element)
+            else:
+                node.kinds.add(self._leaf_kind(node.tag, element.text))
+
+    def _compile(self, shape):
+        """Turns learned nodes into a dispatch table mapping full tag names
+        to (tag, child_table_or_leaf_converter, is_branch) entries. Tags with
+        an inconsistent shape map to ``None``."""
+        table = {}
+        for full_tag, node in shape.iteritems():
+            if node is _SKIP:
+                table[full_tag] = _SKIP
+            elif node.mixed:
+                table[full_tag] = None
+            elif node.branch:
+                table[full_tag] = (node.tag, self._compile(node.children),
+                    True)
+            elif 'hint' in node.kinds:
+                table[full_tag] = (node.tag, _hinted(self.hints[node.tag]),
+                    False)
+            elif len(node.kinds) == 1 and 'other' not in node.kinds:
+                kind, = node.kinds
+                table[full_tag] = (node.tag, _leaf_converters[kind], False)
+            else:
+                table[full_tag] = (node.tag, _convert_text, False)
+        return table
+
+    def _convert(self, element):
+        entry = self._table.get(element.tag)
+        if not entry or entry is _SKIP or not entry[2] or not len(element):
+            self.fallbacks += 1
+            return etree_to_dict(element, namespace=self.namespace,
+                hints=self.hints)
+        record_tag, table, _ = entry
+        result = {}
+        stack = [(iter(element), table, result)]
+        while stack:
+            children, table, response = stack[-1]
+            for child in children:
+                entry = table.get(child.tag)
+                if entry is _SKIP:
+                    continue
+                branch = len(child)
+                if entry is None or entry[2] != bool(branch):
+                    self.fallbacks += 1
+                    tag, value = etree_to_dict(child,
+                        namespace=self.namespace, hints=self.hints)
+                    if tag is None:
+                        continue
+                    branch = False
+                elif branch:
+                    tag, child_table, _ = entry
+                    value = {}
+                    stack.append((iter(child), child_table, value))
+                else:
+                    tag, converter, _ = entry
+                    value = converter(child.text)
+                if tag in response:
+                    if isinstance(response[tag], list):
+                        response[tag].append(value)
+                    else:
+                        response[tag] = [response[tag], value]
+                else:
+                    response[tag] = value
+                if branch:
+                    break
+            else:
+                stack.pop()
+        return record_tag, result
+
+def iter_records(source, tag, namespace="", hints=None, learn=0):
+    """iter_records(source, tag, [namespace, hints, learn]) -> iterator of
+    ("tag_name", dict_with_children)
+
+    Incrementally parses `source` (a file name or a file object) and yields
+    every `tag` element converted with `etree_to_dict`. `tag` is given
+    without the namespace. `namespace` and `hints` are optional, see
+    `etree_to_dict`. If `learn` is given, records are converted with
+    a `RecordConverter` learning their shape from that many first records.
+
+    Elements are discarded as soon as they're processed so memory usage
+    doesn't depend on the size of the document. Records nested in other
+    records are only yielded as part of the outer one.
+    """
+    if learn:
+        convert = RecordConverter(namespace=namespace, hints=hints,
+            samples=learn)
     else:
-        response = element.text
-        for converter in _converters:
-            try:
-                response = converter(response)
-            except (ValueError, TypeError):
+        convert = partial(etree_to_dict, namespace=namespace, hints=hints)
+    return _iter_records(source, namespace + tag, convert)
+
+def _iter_records(source, record_tag, convert, trie=None):
+    """Yields `convert(element)` for every outermost `record_tag` element of
+    `source`. If `trie` (see `_path_trie`) is given, elements of a record
+    which are not on a requested path are cleared as soon as they end. They
+    are not detached: removing children by identity costs more than the
+    empty elements left behind."""
+    open_records = 0
+    parents = []
+    nodes = []      # trie nodes of the open elements of a record
+    for event, element in iterparse(source, events=(b'start', b'end')):
+        if event == 'start':
+            if nodes:
+                node = nodes[-1]
+                if node is not None and node is not _CAPTURE:
+                    node = node.get(element.tag)
+                nodes.append(node)
+            elif trie is not None and element.tag == record_tag:
+                nodes.append(trie)
+            parents.append(element)
+            if element.tag == record_tag:
+                open_records += 1
+            continue
+        parents.pop()
+        if nodes and nodes.pop() is None:
+            element.clear()
+        if element.tag == record_tag:
+            open_records -= 1
+            if not open_records:
+                yield convert(element)
+        if not open_records:
+            # nothing outside of records is needed
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+
+_CAPTURE = object()
+
+def _path_trie(paths, namespace=""):
+    """Returns the record tag shared by `paths` and a trie of the tags below
+    it, keyed by tags in Clark notation. Requested elements are marked with
+    `_CAPTURE`, so is the whole trie if the record itself is requested."""
+    record_tag = None
+    trie = {}
+    for path in paths:
+        tags = path.strip('/').split('/')
+        if record_tag is None:
+            record_tag = tags[0]
+        elif tags[0] != record_tag:
+            raise ValueError("All paths must start with the same tag: "
+                "{!r} doesn't start with {!r}.".format(path, record_tag))
+        if len(tags) == 1:
+            trie = _CAPTURE
+        if trie is _CAPTURE:
+            continue
+        node = trie
+        for tag in tags[1:-1]:
+            node = node.setdefault(namespace + tag, {})
+            if node is _CAPTURE:
+                break
+        else:
+            node[namespace + tags[-1]] = _CAPTURE
+    if record_tag is None:
+        raise ValueError("No paths given.")
+    return record_tag, trie
+
+def _project(trie, namespace, hints, element):
+    """Converts the children of `element` requested in `trie`."""
+    prefix_length = len(namespace)
+    response = {}
+    for child in element:
+        node = trie.get(child.tag)
+        if node is None:
+            continue
+        if node is _CAPTURE:
+            tag, value = etree_to_dict(child, namespace=namespace,
+                hints=hints)
+        else:
+            tag, value = child.tag[prefix_length:], _project(node,
+                namespace, hints, child)[1]
+            if not value:
                 continue
+        if tag in response:
+            if isinstance(response[tag], list):
+                response[tag].append(value)
+            else:
+                response[tag] = [response[tag], value]
+        else:
+            response[tag] = value
+    return element.tag[prefix_length:], response
+
+def iter_fields(source, paths, namespace="", hints=None):
+    """iter_fields(source, paths, [namespace, hints]) -> iterator of
+    ("tag_name", dict_with_requested_fields)
+
+    Like `iter_records` but only the fields given by `paths` are converted,
+    everything else is skipped. Paths are simple, slash-separated tag names
+    (without the namespace) starting with the record tag, e.g.
+    ``['item/price', 'item/meta/updated']``. Requested elements with
+    children are converted as a whole. Fields missing in a record are
+    missing in the resulting dictionary as well. Elements which are not on
+    any of the paths are dropped as soon as they're parsed.
+    """
+    record_tag, trie = _path_trie(paths, namespace)
+    if trie is _CAPTURE:
+        return iter_records(source, record_tag, namespace=namespace,
+            hints=hints)
+    return _iter_records(source, namespace + record_tag,
+        partial(_project, trie, namespace, hints), trie)
+
+NAMESPACE_DECLARATION_REGEX = re.compile(
+    br'''\sxmlns(?::([\w.-]+))?\s*=\s*(?:"([^"]*)"|'([^']*)')''')
+XML_DECLARATION_REGEX = re.compile(br'\s*<\?xml[^>]*\?>')
+ROOT_REGEX = re.compile(br'<([^?!\s/>]+)[^>]*>')
+TAG_END_REGEX = re.compile(
+    br'''[^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>''')
+
+class _Unsplittable(Exception):
+    """Raised by `_scan_records` when a document can't be safely split into
+    records by scanning its bytes."""
+
+def _record_prefixes(root, namespace):
+    """Returns the namespace declarations on the `root` start tag and the
+    prefixes it binds to `namespace` (an empty prefix meaning unprefixed
+    tags)."""
+    uri = namespace[1:-1].encode('utf8')
+    default = b''
+    declarations = []
+    prefixes = []
+    for match in NAMESPACE_DECLARATION_REGEX.finditer(root):
+        declarations.append(match.group())
+        prefix, value = match.group(1), match.group(2)
+        if value is None:
+            value = match.group(3)
+        if prefix is None:
+            default = value
+        elif value == uri:
+            prefixes.append(prefix)
+    if default == uri:
+        prefixes.append(b'')
+    return declarations, prefixes
+
+def _check_gap(buf, start, end):
+    """Raises `_Unsplittable` if text between records could contain
+    namespace declarations, comments or CDATA sections changing what is
+    a record."""
+    if buf.find(b'xmlns', start, end) != -1 or \
+        buf.find(b'<!', start, end) != -1:
+        raise _Unsplittable
+
+def _scan_records(stream, tag, namespace="", block_size=1 << 20):
+    """Yields the document's XML declaration and namespace declarations of
+    its root element (as a wrapper to parse records with) and then the
+    offset in `stream` and the raw bytes of each top-level `tag` element in
+    `namespace`.
+
+    Records are only recognized by the prefixes the root element binds to
+    `namespace`. Raises `_Unsplittable` as soon as the document is found not
+    to be simple enough for that: it has a DTD, its root element is
+    a record, or namespace declarations, comments or CDATA sections appear
+    outside of records."""
+    buf = stream.read(block_size)
+    root = ROOT_REGEX.search(buf)
+    while root is None:
+        block = stream.read(block_size)
+        if not block:
+            return
+        buf += block
+        root = ROOT_REGEX.search(buf)
+    if buf.find(b'<!', 0, root.start()) != -1:
+        raise _Unsplittable
+    declarations, prefixes = _record_prefixes(root.group(), namespace)
+    encoded_tag = tag.encode('utf8')
+    root_prefix, _, root_tag = root.group(1).rpartition(b':')
+    if not prefixes or (root_tag == encoded_tag and root_prefix in prefixes):
+        raise _Unsplittable
+    boundary = re.compile(br'<(/?)(?:' + b'|'.join(re.escape(prefix) + b':'
+        if prefix else b'' for prefix in prefixes) + br')' +
+        re.escape(encoded_tag) + br'(?=[\s/>])')
+    declaration = XML_DECLARATION_REGEX.match(buf)
+    yield (declaration.group().lstrip() if declaration else b'') + \
+        b'<records' + b''.join(declarations) + b'>'
+    pos = root.end()
+    base = 0        # offset of `buf` in `stream`
+    start = None    # offset of the current top-level record in `buf`
+    gap = pos       # offset of the text after the last record in `buf`
+    depth = 0
+    while True:
+        match = boundary.search(buf, pos)
+        end = TAG_END_REGEX.match(buf, match.end()) if match else None
+        if end is None:
+            block = stream.read(block_size)
+            if not block:
+                if start is not None:
+                    raise _Unsplittable
+                return
+            if start is not None:
+                keep = start
+            else:
+                if match:
+                    keep = match.start()
+                else:
+                    keep = buf.rfind(b'<', pos)
+                    if keep == -1:
+                        keep = len(buf)
+                _check_gap(buf, gap, keep)
+                gap = 0
+            buf = buf[keep:] + block
+            base += keep
+            pos = max(0, pos - keep)
+            if start is not None:
+                start = 0
+            continue
+        pos = end.end()
+        if match.group(1):
+            if depth:
+                depth -= 1
+                if not depth:
+                    record = buf[start:pos]
+                    if b'<!' in record:
+                        raise _Unsplittable
+                    yield base + start, record
+                    start = None
+                    gap = pos
+            continue
+        if not depth:
+            _check_gap(buf, gap, match.start())
+            if buf.find(b'xmlns', match.start(), pos) != -1:
+                raise _Unsplittable
+        if buf[pos - 2:pos - 1] == b'/':
+            if not depth:
+                yield base + match.start(), buf[match.start():pos]
+                gap = pos
+        else:
+            if not depth:
+                start = match.start()
+            depth += 1
+
+def _parse_record(header, namespace, hints, record):
+    offset, raw = record
+    try:
+        element = fromstring(header + raw + b'</records>')[0]
+    except SyntaxError as e:
+        # ParseError doesn't survive pickling on its way from the worker
+        raise ValueError("Malformed record at offset {}: {}".format(offset,
+            e))
+    return etree_to_dict(element, namespace=namespace, hints=hints)
+
+def iter_records_parallel(source, tag, namespace="", hints=None,
+    workers=None, chunksize=None):
+    """iter_records_parallel(source, tag, [namespace, hints, workers,
+    chunksize]) -> iterator of ("tag_name", dict_with_children)
+
+    Like `iter_records` but records are parsed and converted on a pool of
+    `workers` processes (by default: one per CPU). The main process only
+    scans `source` (a file name or a file object opened in binary mode) for
+    the raw bytes of top-level `tag` elements. Records are yielded in
+    document order, only a bounded number of them is in flight at any time.
+    `chunksize` is the number of records sent to a worker at once, tuned
+    automatically by default. See `lck.concurrency.pmap`.
+
+    A malformed record raises `ValueError` with its offset in `source`.
+    Documents that can't be safely split into records by scanning their
+    bytes (e.g. ones with a DTD, namespace declarations below the root
+    element or comments) are converted with `iter_records` instead,
+    continuing after the records already yielded. This needs `source` to
+    be seekable, otherwise `ValueError` is raised.
+    """
+    stream = open(source, 'rb') if isinstance(source, basestring) else source
+    try:
+        position = stream.tell()
+    except (AttributeError, IOError):
+        position = None
+    yielded = 0
+    try:
+        try:
+            records = _scan_records(stream, tag, namespace)
+            header = next(records, None)
+            if header is None:
+                return
+            parse = partial(_parse_record, header, namespace, hints)
+            for record_tag, value in pmap(parse, records, workers=workers,
+                mode='process', chunksize=chunksize):
+                yielded += 1
+                if record_tag is not None:
+                    yield record_tag, value
+            return
+        except _Unsplittable:
+            if position is None:
+                raise ValueError("The document can't be split into records, "
+                    "use iter_records() instead.")
+        stream.seek(position)
+        convert = partial(etree_to_dict, namespace=namespace, hints=hints)
+        for index, element in enumerate(_iter_records(stream,
+            namespace + tag, lambda element: element)):
+            if index >= yielded:
+                record_tag, value = convert(element)
+                if record_tag is not None:
+                    yield record_tag, value
+    finally:
+        if stream is not source:
+            stream.close()
+
+def _xml_text(value, encoding):
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, bytes):
+        return value.decode(encoding)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return unicode(value)
+
+def dict_to_xml(tag, value, stream, namespace="", encoding='utf-8',
+    xml_declaration=True, buffer_size=65536):
+    """dict_to_xml(tag, value, stream, [namespace, encoding, xml_declaration,
+    buffer_size]) -> None
+
+    Writes `value` as a `tag` element to `stream` (a file-like object opened
+    in binary mode). The conventions are the same as in `etree_to_dict` so
+    ``dict_to_xml(*etree_to_dict(element), stream=stream)`` round-trips:
+    dictionaries become child elements, lists, tuples and other iterators
+    become repeated elements and ``None`` an empty one. Datetimes are written
+    in ISO 8601 format, floats with `repr`.
+
+    `namespace` is optional, must be given in Clark notation, e.g.
+    "{ns_uri}". It's declared as the default namespace of the root element.
+
+    The document is generated iteratively and written to `stream` whenever
+    about `buffer_size` characters are pending, so its size is not limited
+    by available memory as long as the iterators passed in are lazy.
+    """
+    buffer = []
+    buffered = 0
+    if xml_declaration:
+        buffer.append('<?xml version="1.0" encoding="{}"?>\n'.format(
+            encoding))
+    root_attributes = ''
+    if namespace:
+        root_attributes = ' xmlns={}'.format(quoteattr(namespace[1:-1]))
+    # each entry holds an iterator over (tag, value) pairs and the tag to
+    # close once it's exhausted
+    stack = [(iter(((tag, value),)), None)]
+    while stack:
+        items, closing_tag = stack[-1]
+        for tag, value in items:
+            if isinstance(value, (list, tuple, Iterator)):
+                stack.append((izip(repeat(tag), value), None))
+                break
+            attributes = root_attributes if len(stack) == 1 else ''
+            if isinstance(value, dict):
+                piece = '<' + tag + attributes + '>'
+            elif value is None:
+                piece = '<' + tag + attributes + '/>'
             else:
+                piece = ('<' + tag + attributes + '>' +
+                    escape(_xml_text(value, encoding)) + '</' + tag + '>')
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered >= buffer_size:
+                stream.write(''.join(buffer).encode(encoding,
+                    'xmlcharrefreplace'))
+                del buffer[:]
+                buffered = 0
+            if isinstance(value, dict):
+                stack.append((value.iteritems(), tag))
                 break
-    return element.tag[len(namespace):], response
+        else:
+            stack.pop()
+            if closing_tag is not None:
+                piece = '</' + closing_tag + '>'
+                buffer.append(piece)
+                buffered += len(piece)
+    stream.write(''.join(buffer).encode(encoding, 'xmlcharrefreplace'))
 
 def substitute_entity(match):
     ent = match.group(3)
@@ -96,6 +805,40 @@ def substitute_entity_encode(match, encoding):
         result = result.encode(encoding)
     return result
 
+# decoded entities by encoding, named ones are known up front
+_entity_caches = {None: dict(('&{};'.format(name), unichr(codepoint))
+    for name, codepoint in n2cp.iteritems())}
+_substitutes = {}
+
+def _cached_substitute(encoding):
+    """Returns a substitution function for `encoding` which remembers the
+    decoded entities."""
+    try:
+        return _substitutes[encoding]
+    except KeyError:
+        pass
+    cache = _entity_caches.setdefault(encoding, {})
+    substitute = substitute_entity
+    if encoding:
+        substitute = partial(substitute_entity_encode, encoding=encoding)
+
+    def substitute_cached(match):
+        entity = match.group()
+        try:
+            return cache[entity]
+        except KeyError:
+            pass
+        result = substitute(match)
+        # unknown entities are left as they are, don't fill the cache with
+        # those
+        known = match.group(1) or n2cp.get(match.group(3))
+        if known and len(cache) < ENTITY_CACHE_SIZE:
+            cache[entity] = result
+        return result
+
+    _substitutes[encoding] = substitute_cached
+    return substitute_cached
+
 def decode_entities(string, encoding=None):
     """decode_entities(string, [encoding]) -> string_with_decoded_entities
 
@@ -107,8 +850,44 @@ def decode_entities(string, encoding=None):
     an UnicodeDecodeError will be raised. This is because we have to support
     the &#xxxx; entity which enables people to use any Unicode codepoint.
     """
-    substitute = substitute_entity
-    if encoding:
-        substitute = partial(substitute_entity_encode,
-            encoding=encoding)
-    return ENTITY_REGEX.subn(substitute, string)[0]
+    if b'&' not in string:
+        return string
+    return ENTITY_REGEX.sub(_cached_substitute(encoding), string)
+
+def decode_entities_many(strings, encoding=None):
+    """decode_entities_many(strings, [encoding]) -> list_of_decoded_strings
+
+    Decodes XML entities from each of the given strings, like
+    `decode_entities` but without the per-call overhead.
+    """
+    substitute = partial(ENTITY_REGEX.sub, _cached_substitute(encoding))
+    return [substitute(string) if b'&' in string else string
+        for string in strings]
+
+def iter_decode_entities(stream, encoding=None, chunk_size=65536):
+    """iter_decode_entities(stream, [encoding, chunk_size]) -> iterator of
+    decoded chunks
+
+    Reads `stream` (a file-like object) in chunks of `chunk_size` and yields
+    them with XML entities decoded, like `decode_entities`. Entities split
+    between chunks are decoded as well.
+    """
+    substitute = partial(ENTITY_REGEX.sub, _cached_substitute(encoding))
+    tail = None
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if tail:
+            chunk = tail + chunk
+        # an entity can't contain another ampersand so the last one is the
+        # only place where the chunk can't be cut safely
+        cut = chunk.rfind(b'&')
+        if cut == -1 or len(chunk) - cut >= ENTITY_MAX_LENGTH:
+            cut = len(chunk)
+        tail = chunk[cut:]
+        chunk = chunk[:cut]
+        if chunk:
+            yield substitute(chunk) if b'&' in chunk else chunk
+    if tail:
+        yield substitute(tail)
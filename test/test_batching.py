@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Request coalescing tests
+   ------------------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from threading import Thread
+
+from lck.concurrency import batched
+
+WINDOW=0.05 #seconds
+
+
+def _call_concurrently(func, items):
+    results = {}
+    def target(item):
+        try:
+            results[item] = func(item)
+        except Exception as e:
+            results[item] = e
+    threads = [Thread(target=target, args=(item,)) for item in items]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_coalescing():
+    calls = []
+
+    @batched(max_size=10, window=WINDOW)
+    def square(items):
+        calls.append(len(items))
+        return [i * i for i in items]
+
+    results = _call_concurrently(square, range(25))
+    assert results == {i: i * i for i in range(25)}
+    assert sum(calls) == 25
+    assert max(calls) <= 10
+    assert len(calls) < 25
+    assert square.bulk([3]) == [9]
+
+
+def test_single_call():
+    @batched
+    def double(items):
+        return [2 * i for i in items]
+
+    assert double(21) == 42
+
+
+def test_exceptions():
+    @batched(window=WINDOW)
+    def invert(items):
+        if None in items:
+            raise TypeError('None given')
+        return [1.0 / i if i else ValueError('zero') for i in items]
+
+    results = _call_concurrently(invert, [0, 1, 2])
+    assert isinstance(results[0], ValueError)
+    assert results[1] == 1
+    assert results[2] == 0.5
+
+    results = _call_concurrently(invert, [None, 1])
+    assert all(isinstance(r, TypeError) for r in results.values())
+
+
+def test_result_count_mismatch():
+    @batched
+    def broken(items):
+        return []
+
+    try:
+        broken(1)
+    except ValueError:
+        pass
+    else:
+        assert False, "Exception not raised."
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Cipher tests
+   ------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from io import BytesIO
+import os
+import random
+import shutil
+import tempfile
+from threading import Thread
+
+import pytest
+
+from lck.crypto import aes, blowfish, CipherPool
+from lck.crypto.cipher import Cipher
+
+
+KEY = b'0123456789abcdef0123456789abcdef'
+
+
+def test_encrypt_decrypt():
+    for factory in (aes, blowfish):
+        cipher = factory(key=KEY)
+        for length in xrange(3 * cipher.block):
+            data = os.urandom(length)
+            encrypted = cipher.encrypt(data)
+            assert len(encrypted) % cipher.block == 0
+            assert cipher.decrypt(encrypted) == data
+            assert cipher.decrypt(cipher.encrypt(data, base64=True),
+                base64=True) == data
+
+
+def test_padding():
+    for factory in (aes, blowfish):
+        cipher = factory(key=KEY)
+        for length in xrange(200):
+            padded = cipher._pad_buffer(b'x' * length)
+            assert len(padded) == cipher.encrypted_size(length)
+            assert len(padded) % cipher.block == 0
+            pad_bytes = len(padded) - length
+            assert ord(padded[-1]) % cipher.block == pad_bytes % cipher.block
+            assert cipher._depad_buffer(padded) == b'x' * length
+
+
+def test_into():
+    cipher = aes(key=KEY)
+    out = bytearray(100)
+    for length in (0, 1, 15, 16, 17, 50):
+        data = os.urandom(length)
+        for buf in (data, bytearray(data), memoryview(data)):
+            size = cipher.encrypt_into(buf, out)
+            assert size == cipher.encrypted_size(length)
+            encrypted = bytes(out[:size])
+            assert cipher.decrypt(encrypted) == data
+            plain = bytearray(size)
+            assert cipher.decrypt_into(memoryview(encrypted), plain) == length
+            assert plain[:length] == data
+            view = memoryview(out)
+            assert cipher.decrypt_into(bytearray(encrypted), view) == length
+            assert out[:length] == data
+    with pytest.raises(ValueError):
+        cipher.encrypt_into(b'x' * 16, bytearray(16))
+    with pytest.raises(ValueError):
+        cipher.decrypt_into(b'x' * 15, out)
+    with pytest.raises(ValueError):
+        cipher.decrypt_into(cipher.encrypt(b'x' * 20), bytearray(19))
+    with pytest.raises(AssertionError):
+        cipher.encrypt_into(u'abc', out)
+
+
+def test_streams():
+    cipher = aes(key=KEY)
+    for length in (0, 1, 15, 16, 17, 1000, 4096):
+        data = os.urandom(length)
+        for chunk_size in (1, 7, 16, 100, 65536):
+            encrypted = BytesIO()
+            cipher.encrypt_stream(BytesIO(data), encrypted, chunk_size)
+            assert len(encrypted.getvalue()) == len(cipher.encrypt(data))
+            assert cipher.decrypt(encrypted.getvalue()) == data
+            decrypted = BytesIO()
+            cipher.decrypt_stream(BytesIO(encrypted.getvalue()), decrypted,
+                chunk_size)
+            assert decrypted.getvalue() == data
+            encoded = BytesIO()
+            cipher.encrypt_stream(BytesIO(data), encoded, chunk_size,
+                base64=True)
+            assert cipher.decrypt(encoded.getvalue(), base64=True) == data
+            # line breaks are fine
+            wrapped = cipher.encrypt(data, base64=True)
+            wrapped = b'\n'.join(wrapped[i:i + 10]
+                for i in xrange(0, len(wrapped), 10))
+            decrypted = BytesIO()
+            cipher.decrypt_stream(BytesIO(wrapped), decrypted, chunk_size,
+                base64=True)
+            assert decrypted.getvalue() == data
+
+
+def test_key_from_path():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'key')
+        with pytest.raises(IOError):
+            aes(path=path, create=False)
+        cipher = aes(path=path)
+        assert os.listdir(directory) == ['key']
+        assert os.stat(path).st_mode & 0o777 == 0o400
+        key = Cipher.key_from_path(path)
+        assert len(key) == 32
+        assert Cipher.key_from_path(path) is key
+        assert aes(path=path).decrypt(cipher.encrypt(b'data')) == b'data'
+        blowfish(path=os.path.join(directory, 'blowfish'))
+        assert len(Cipher.key_from_path(os.path.join(directory,
+            'blowfish'))) == 56
+        # replacing the file invalidates the cache
+        os.unlink(path)
+        with open(path, 'wb') as key_file:
+            key_file.write(KEY)
+        assert Cipher.key_from_path(path) == KEY
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_many():
+    cipher = aes(key=KEY)
+    fields = [os.urandom(length) for length in xrange(50)]
+    encrypted = cipher.encrypt_many(iter(fields))
+    assert [len(e) for e in encrypted] == [len(cipher.encrypt(f))
+        for f in fields]
+    assert [cipher.decrypt(e) for e in encrypted] == fields
+    assert cipher.decrypt_many(encrypted) == fields
+    encoded = cipher.encrypt_many(fields, base64=True)
+    assert cipher.decrypt_many(encoded, base64=True) == fields
+    assert cipher.encrypt_many([]) == cipher.decrypt_many([]) == []
+    with pytest.raises(ValueError):
+        cipher.decrypt_many([encrypted[0], encrypted[1][1:]])
+    with pytest.raises(AssertionError):
+        cipher.encrypt_many([b'abc', u'abc'])
+
+
+def test_pool():
+    pool = CipherPool(aes, key=KEY)
+    with pool.cipher() as first:
+        with pool.cipher() as second:
+            assert first is not second
+    assert pool.acquire() in (first, second)
+    fields = [os.urandom(length) for length in xrange(100)]
+    results = []
+
+    def worker():
+        for _ in xrange(20):
+            encrypted = pool.encrypt_many(fields)
+            results.append(pool.decrypt_many(encrypted) == fields)
+            results.append(pool.decrypt(pool.encrypt(b'x')) == b'x')
+    threads = [Thread(target=worker) for _ in xrange(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 160 and all(results)
+
+
+def test_files():
+    directory = tempfile.mkdtemp()
+    try:
+        plain = os.path.join(directory, 'plain')
+        encrypted = os.path.join(directory, 'encrypted')
+        decrypted = os.path.join(directory, 'decrypted')
+        for factory in (aes, blowfish):
+            cipher = factory(key=KEY)
+            for size in (0, 1, 100, 100000):
+                data = os.urandom(size)
+                with open(plain, 'wb') as f:
+                    f.write(data)
+                for workers in (1, 2):
+                    cipher.encrypt_file(plain, encrypted, workers=workers,
+                        chunk_size=4099)
+                    with open(encrypted, 'rb') as f:
+                        content = f.read()
+                    header_size = len(content) - size
+                    assert header_size == 8 + 32
+                    if size >= 16:
+                        assert data[:16] not in content
+                        # the first counter block is encrypted with the file
+                        # key, not with the key used by encrypt()
+                        block = cipher.block
+                        keystream = b''.join(chr(ord(a) ^ ord(b)) for a, b in
+                            zip(data, content[header_size:][:block]))
+                        assert keystream != cipher.encrypt(
+                            b'\x00' * block)[:block]
+                        cipher.encrypt_file(plain, decrypted)
+                        with open(decrypted, 'rb') as f:
+                            assert f.read()[header_size:] != \
+                                content[header_size:]
+                    cipher.decrypt_file(encrypted, decrypted,
+                        workers=workers, chunk_size=1000)
+                    with open(decrypted, 'rb') as f:
+                        assert f.read() == data
+                for _ in xrange(20):
+                    offset = random.randint(0, size)
+                    length = random.randint(0, size - offset)
+                    assert cipher.decrypt_range(encrypted, offset,
+                        length) == data[offset:offset + length]
+        with pytest.raises(ValueError):
+            cipher.decrypt_range(plain, 0, 1)
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Membership filters tests
+   ------------------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+import pytest
+
+from lck.collections import BloomFilter, CuckooFilter, FilterFull
+
+
+def _check_filter(f, count=5000):
+    keys = ['key{}'.format(i) for i in xrange(count)]
+    f.add_many(keys[:count // 2])
+    f.add(keys[-1])
+    assert len(f) == count // 2 + 1
+    assert all(f.contains_many(keys[:count // 2]))
+    assert keys[-1] in f
+    false_positives = sum(f.contains_many(keys[count // 2:-1]))
+    assert false_positives / (count // 2) < 0.03
+    assert [key in f for key in keys] == f.contains_many(keys)
+
+
+def _check_shared_file(cls):
+    f = cls(1000, 0.01)
+    f.add_many(xrange(100))
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        f.save(path)
+        first = cls.load(path)
+        second = cls.load(path)
+        assert all(first.contains_many(xrange(100)))
+        first.add('new key')
+        assert 'new key' in second
+        assert len(second) == 101
+        first.close()
+        second.close()
+        third = cls.load(path)
+        assert 'new key' in third
+        third.close()
+    finally:
+        os.unlink(path)
+
+
+def test_bloom_filter():
+    _check_filter(BloomFilter(5000, 0.01))
+    _check_shared_file(BloomFilter)
+
+
+def test_cuckoo_filter():
+    _check_filter(CuckooFilter(5000, 0.01))
+    _check_shared_file(CuckooFilter)
+
+
+def test_cuckoo_filter_removal():
+    f = CuckooFilter(1000, 0.01)
+    f.add_many(xrange(1000))
+    for i in xrange(500):
+        assert f.discard(i)
+    assert len(f) == 500
+    assert all(f.contains_many(xrange(500, 1000)))
+    assert sum(f.contains_many(xrange(500))) < 10
+
+
+def test_cuckoo_filter_full():
+    f = CuckooFilter(100)
+    added = 0
+    try:
+        for i in xrange(1000):
+            f.add(i)
+            added += 1
+    except FilterFull:
+        pass
+    else:
+        assert False, "Exception not raised."
+    assert len(f) == added
+    assert all(f.contains_many(xrange(added)))
+
+
+def test_equal_keys():
+    for cls in (BloomFilter, CuckooFilter):
+        f = cls(100)
+        f.add(1)
+        f.add('a')
+        f.add(2.5)
+        assert all(key in f for key in (1, 1L, 1.0, True, b'a', u'a', 2.5))
+        with pytest.raises(TypeError):
+            f.add((1, 'a'))
+
+
+def test_bloom_filter_probes():
+    for capacity in (0, 10, 1000):
+        f = BloomFilter(capacity)
+        num_bits = f._header.num_bits
+        assert num_bits >= 8 and not num_bits & (num_bits - 1)
+        for key in xrange(2000):
+            assert len(set(f._positions(key))) == f._header.num_hashes
@@ -0,0 +1,182 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Concurrency limiting tests
+   --------------------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+from threading import Thread, Lock
+from time import time, sleep
+
+from lck.concurrency import limit, rate_limited, LimitExceeded
+from lck.concurrency import SharedMemoryLock
+from lck.concurrency.limiting import TokenBucket
+
+SLEEP_AMOUNT=0.05 #seconds
+
+
+def _run_concurrently(func, count=10):
+    errors = []
+    def target():
+        try:
+            func()
+        except LimitExceeded as e:
+            errors.append(e)
+    threads = [Thread(target=target) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def _limited_tracker(decorator, sleep_amount=SLEEP_AMOUNT):
+    state = {'current': 0, 'peak': 0}
+    state_lock = Lock()
+
+    @decorator
+    def tracked():
+        with state_lock:
+            state['current'] += 1
+            state['peak'] = max(state['peak'], state['current'])
+        sleep(sleep_amount)
+        with state_lock:
+            state['current'] -= 1
+
+    return tracked, state
+
+
+def test_thread_limit():
+    tracked, state = _limited_tracker(limit(3))
+    assert _run_concurrently(tracked) == []
+    assert state['peak'] == 3
+
+
+def test_nonblocking_limit():
+    tracked, state = _limited_tracker(limit(2, blocking=False))
+    errors = _run_concurrently(tracked)
+    assert state['peak'] <= 2
+    assert len(errors) >= 1
+
+
+def test_limit_timeout():
+    tracked, state = _limited_tracker(limit(1, timeout=SLEEP_AMOUNT / 5),
+        sleep_amount=SLEEP_AMOUNT * 4)
+    errors = _run_concurrently(tracked, count=3)
+    assert state['peak'] == 1
+    assert len(errors) == 2
+
+
+def test_filebased_limit():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'test.slots')
+        tracked, state = _limited_tracker(limit(2, path=path))
+        assert _run_concurrently(tracked) == []
+        assert state['peak'] == 2
+        assert sorted(os.listdir(tmp)) == ['test.slots.0', 'test.slots.1']
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_rate_limit():
+    @rate_limited(100, burst=5)
+    def func():
+        pass
+
+    start = time()
+    for i in xrange(25):
+        func()
+    elapsed = time() - start
+    assert 0.18 < elapsed < 0.5
+
+
+def test_nonblocking_rate_limit():
+    @rate_limited(10, burst=3, blocking=False)
+    def func():
+        pass
+
+    for i in xrange(3):
+        func()
+    try:
+        func()
+    except LimitExceeded:
+        pass
+    else:
+        assert False, "Exception not raised."
+    sleep(0.15)
+    func()
+
+
+def test_filebased_rate_limit():
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'test.bucket')
+        first = rate_limited(1, burst=5, path=path, blocking=False)(
+            lambda: None)
+        second = rate_limited(1, burst=5, path=path, blocking=False)(
+            lambda: None)
+        calls = 0
+        for func in (first, second) * 5:
+            try:
+                func()
+                calls += 1
+            except LimitExceeded:
+                pass
+        assert calls == 5
+    finally:
+        shutil.rmtree(tmp)
+
+
+def test_shared_memory_rate_limit():
+    tmp = tempfile.mkdtemp()
+    lock = SharedMemoryLock('lck-test-bucket-{}'.format(os.getpid()))
+    try:
+        path = os.path.join(tmp, 'test.bucket')
+        bucket = TokenBucket(1, burst=5, path=path, lock=lock)
+        assert bucket._lock is lock
+        func = rate_limited(1, burst=5, path=path, lock=lock,
+            blocking=False)(lambda: None)
+        calls = 0
+        for i in xrange(10):
+            try:
+                func()
+                calls += 1
+            except LimitExceeded:
+                pass
+        assert calls == 5
+    finally:
+        lock.unlink()
+        shutil.rmtree(tmp)
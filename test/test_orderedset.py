@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""OrderedSet tests
+   ----------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import pickle
+import random
+
+from lck.collections import OrderedSet
+
+
+def test_order():
+    s = OrderedSet('abracadabra')
+    assert list(s) == ['a', 'b', 'r', 'c', 'd']
+    assert list(reversed(s)) == ['d', 'c', 'r', 'b', 'a']
+    assert len(s) == 5
+    assert 'c' in s
+    assert 'z' not in s
+    assert repr(s) == "OrderedSet([u'a', u'b', u'r', u'c', u'd'])"
+    assert repr(OrderedSet()) == "OrderedSet()"
+
+
+def test_discard_and_pop():
+    s = OrderedSet(range(10))
+    s.discard(3)
+    s.discard(3)
+    s.remove(9)
+    assert list(s) == [0, 1, 2, 4, 5, 6, 7, 8]
+    assert s.pop() == 8
+    assert s.pop(last=False) == 0
+    assert list(s) == [1, 2, 4, 5, 6, 7]
+    s.add(3)
+    assert list(s) == [1, 2, 4, 5, 6, 7, 3]
+    while s:
+        s.pop(last=False)
+    try:
+        s.pop()
+    except KeyError:
+        pass
+    else:
+        assert False, "Exception not raised."
+
+
+def test_random_operations():
+    random.seed(0)
+    s = OrderedSet()
+    reference = []
+    for i in xrange(5000):
+        key = random.randrange(200)
+        action = random.random()
+        if action < 0.5:
+            s.add(key)
+            if key not in reference:
+                reference.append(key)
+        elif action < 0.9:
+            s.discard(key)
+            if key in reference:
+                reference.remove(key)
+        elif action < 0.95 and reference:
+            key = random.choice(reference)
+            last = action < 0.925
+            s.move_to_end(key, last=last)
+            reference.remove(key)
+            reference.insert(len(reference) if last else 0, key)
+        elif reference:
+            last = action < 0.975
+            assert s.pop(last=last) == reference.pop(-1 if last else 0)
+        assert list(s) == reference
+        assert len(s) == len(reference)
+    assert list(reversed(s)) == reference[::-1]
+
+
+def test_equality_and_pickle():
+    s = OrderedSet('abc')
+    s.discard('b')
+    assert s == OrderedSet('ac')
+    assert s != OrderedSet('ca')
+    assert s == set('ca')
+    assert pickle.loads(pickle.dumps(s)) == s
+
+
+def test_set_algebra():
+    a = OrderedSet('abcde')
+    b = OrderedSet('fdbx')
+    assert list(a | b) == list('abcdefx')
+    assert list(a & b) == list('bd')
+    assert list(a - b) == list('ace')
+    assert list(a ^ b) == list('acefx')
+    assert list(a.union('zy', 'ya')) == list('abcdezy')
+    assert list(a.intersection('bcd', ['d', 'c'])) == list('cd')
+    assert list(a.difference('a', 'e')) == list('bcd')
+    assert list(a) == list('abcde')
+
+    c = OrderedSet('abcde')
+    c &= 'edcx'
+    assert list(c) == list('cde')
+    c |= 'ab'
+    assert list(c) == list('cdeab')
+    c -= 'd'
+    assert list(c) == list('ceab')
+    c ^= 'bz'
+    assert list(c) == list('ceaz')
+    c -= c
+    assert not c
+
+
+def test_comparisons():
+    a = OrderedSet('abc')
+    assert a.issubset('abcd')
+    assert not a.issubset('ab')
+    assert a.issuperset('ca')
+    assert a <= OrderedSet('cbad')
+    assert a < set('cbad')
+    assert not a == OrderedSet('cba')
+    assert a == frozenset('cba')
+    assert a == ['c', 'b', 'a']
+    assert a != None
+
+
+def test_move_to_end():
+    s = OrderedSet('abcde')
+    s.move_to_end('b')
+    assert list(s) == list('acdeb')
+    s.move_to_end('b')
+    s.move_to_end('d', last=False)
+    assert list(s) == list('daceb')
+    s.discard('d')
+    s.discard('a')
+    s.move_to_end('b', last=False)
+    assert list(s) == list('bce')
+    s.move_to_end('e', last=False)
+    assert list(s) == list('ebc')
+    assert s.pop() == 'c'
+    assert s.pop(last=False) == 'e'
+    assert list(s) == ['b']
+    try:
+        s.move_to_end('z')
+    except KeyError:
+        pass
+    else:
+        assert False, "Exception not raised."
+
+
+def test_positional_access():
+    s = OrderedSet('abcdefgh')
+    assert s[0] == 'a'
+    assert s[-1] == 'h'
+    assert s.index('c') == 2
+    assert list(s[2:5]) == list('cde')
+    assert isinstance(s[2:5], OrderedSet)
+    s.discard('b')
+    s.discard('e')
+    assert list(s) == list('acdfgh')
+    assert s[1] == 'c'
+    assert s[3] == 'f'
+    assert s.index('f') == 3
+    assert list(s[1:4]) == list('cdf')
+    assert list(s[::-2]) == list('hfc')
+    s.add('b')
+    assert s[-1] == 'b'
+    assert s.index('b') == 6
+    assert s.pop(index=2) == 'd'
+    assert s.pop(index=-2) == 'h'
+    assert s.pop(1) == 'b'
+    s.add('b')
+    assert list(s) == list('acfgb')
+    try:
+        s[5]
+    except IndexError:
+        pass
+    else:
+        assert False, "Exception not raised."
+    try:
+        s.index('z')
+    except ValueError:
+        pass
+    else:
+        assert False, "Exception not raised."
+
+
+def test_positional_random_operations():
+    random.seed(1)
+    s = OrderedSet()
+    reference = []
+    for i in xrange(3000):
+        key = random.randrange(100)
+        action = random.random()
+        if action < 0.5:
+            s.add(key)
+            if key not in reference:
+                reference.append(key)
+        elif action < 0.7:
+            s.discard(key)
+            if key in reference:
+                reference.remove(key)
+        elif reference:
+            index = random.randrange(-len(reference), len(reference))
+            if action < 0.8:
+                assert s.pop(index=index) == reference.pop(index)
+            else:
+                assert s[index] == reference[index]
+                assert s.index(reference[index]) == reference.index(
+                    reference[index])
+        assert list(s) == reference
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Parallel map tests
+   ------------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from itertools import count, islice
+from time import sleep
+
+from lck.concurrency import pmap
+
+
+def _check_positive(i):
+    if i < 0:
+        raise ValueError(i)
+    return i
+
+
+def _unpicklable_result(i):
+    return lambda: i
+
+
+def _unpicklable_exception(i):
+    raise ValueError(lambda: i)
+
+
+def test_ordered():
+    for mode in ('thread', 'process'):
+        assert list(pmap(abs, xrange(-500, 500), mode=mode)) == \
+            [abs(i) for i in xrange(-500, 500)]
+        assert list(pmap(abs, [], mode=mode)) == []
+
+
+def test_unordered():
+    for mode in ('thread', 'process'):
+        result = pmap(abs, xrange(-500, 500), workers=3, mode=mode,
+            chunksize=7, ordered=False)
+        assert sorted(result) == sorted(abs(i) for i in xrange(-500, 500))
+
+
+def test_lazy_input():
+    consumed = []
+    def numbers():
+        for i in count():
+            consumed.append(i)
+            yield i
+
+    result = pmap(abs, numbers(), workers=2, chunksize=10)
+    assert list(islice(result, 5)) == range(5)
+    result.close()
+    assert len(consumed) <= 50
+
+
+def test_lazy_input_slow_first_item():
+    consumed = []
+    def numbers():
+        for i in count():
+            consumed.append(i)
+            yield i
+
+    def slow_first(i):
+        if i == 0:
+            sleep(0.5)
+        return i
+
+    result = pmap(slow_first, numbers(), workers=2, chunksize=1)
+    assert next(result) == 0
+    result.close()
+    assert len(consumed) <= 5
+
+
+def test_exception():
+    for mode in ('thread', 'process'):
+        try:
+            list(pmap(_check_positive, xrange(10, -10, -1), mode=mode))
+        except ValueError:
+            pass
+        else:
+            assert False, "Exception not raised."
+
+
+def test_unpicklable():
+    for func in (lambda i: i, _unpicklable_result, _unpicklable_exception):
+        try:
+            list(pmap(func, xrange(10), workers=2, mode='process'))
+        except Exception:
+            pass
+        else:
+            assert False, "Exception not raised."
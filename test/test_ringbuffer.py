@@ -0,0 +1,103 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Ring buffer tests
+   -----------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from array import array
+
+from lck.collections import RingBuffer
+from lck.collections import ringbuffer
+
+
+def test_append_and_extend():
+    r = RingBuffer(5)
+    assert len(r) == 0
+    for i in xrange(3):
+        r.append(i)
+    assert r.tolist() == [0, 1, 2]
+    assert not r.full
+    for i in xrange(3, 7):
+        r.append(i)
+    assert r.full
+    assert list(r) == [2, 3, 4, 5, 6]
+    assert r[0] == 2
+    assert r[-1] == 6
+    r.extend([10, 11])
+    assert r.tolist() == [4, 5, 6, 10, 11]
+    r.extend(xrange(100))
+    assert r.tolist() == [95, 96, 97, 98, 99]
+    r.clear()
+    r.extend([1, 2])
+    assert r.tolist() == [1, 2]
+
+
+def test_views():
+    r = RingBuffer(4)
+    assert r.views() == ()
+    r.extend([1, 2, 3])
+    r.extend([4, 5, 6])
+    views = r.views()
+    assert len(views) == 2
+    values = []
+    for view in views:
+        values.extend(array(b'd', bytes(view)))
+    assert values == [3, 4, 5, 6]
+
+
+def _check_aggregates():
+    r = RingBuffer(4)
+    r.extend([10, 1, 2, 3, 4])
+    assert r.sum() == 10
+    assert r.mean() == 2.5
+    assert r.min() == 1
+    assert r.max() == 4
+    assert r.percentiles([0, 50, 100]) == [1, 2.5, 4]
+    assert r.percentile(25) == 1.75
+    ints = RingBuffer(3, typecode=b'l')
+    ints.extend([1, 2])
+    assert ints.sum() == 3
+    assert ints.max() == 2
+
+
+def test_aggregates():
+    _check_aggregates()
+
+
+def test_aggregates_without_numpy():
+    numpy = ringbuffer.numpy
+    ringbuffer.numpy = None
+    try:
+        _check_aggregates()
+    finally:
+        ringbuffer.numpy = numpy
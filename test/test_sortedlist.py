@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""Sorted containers tests
+   -----------------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import pickle
+import random
+
+from lck.collections import SortedList, SortedSet, SortedDict
+
+
+def test_sorted_list_random_operations():
+    random.seed(0)
+    for load in (4, 1000):
+        s = SortedList(load=load)
+        reference = []
+        for i in xrange(5000):
+            value = random.randrange(300)
+            action = random.random()
+            if action < 0.4:
+                s.add(value)
+                bisect.insort(reference, value)
+            elif action < 0.55:
+                s.discard(value)
+                if value in reference:
+                    reference.remove(value)
+            elif action < 0.6:
+                values = [random.randrange(300) for j in xrange(50)]
+                s.update(values)
+                reference = sorted(reference + values)
+            elif action < 0.7 and reference:
+                index = random.randrange(-len(reference), len(reference))
+                assert s.pop(index) == reference.pop(index)
+            elif action < 0.9 and reference:
+                index = random.randrange(-len(reference), len(reference))
+                assert s[index] == reference[index]
+                assert s.bisect_left(value) == bisect.bisect_left(
+                    reference, value)
+                assert s.bisect_right(value) == bisect.bisect_right(
+                    reference, value)
+                assert s.count(value) == reference.count(value)
+                assert (value in s) == (value in reference)
+            else:
+                start = random.randrange(-320, 320)
+                stop = random.randrange(-320, 320)
+                assert s[start:stop] == reference[start:stop]
+                assert s[stop:start:-2] == reference[stop:start:-2]
+            assert len(s) == len(reference)
+        assert list(s) == reference
+        assert list(reversed(s)) == reference[::-1]
+
+
+def test_sorted_list_irange():
+    s = SortedList(xrange(0, 100, 2), load=4)
+    assert list(s.irange(10, 20)) == [10, 12, 14, 16, 18, 20]
+    assert list(s.irange(10, 20, inclusive=(False, False))) == [12, 14, 16, 18]
+    assert list(s.irange(11, 15, reverse=True)) == [14, 12]
+    assert list(s.irange(maximum=4)) == [0, 2, 4]
+    assert list(s.irange(minimum=95)) == [96, 98]
+    assert list(s.irange(50, 40)) == []
+    assert s.index(40) == 20
+    del s[5:]
+    assert s == [0, 2, 4, 6, 8]
+    assert pickle.loads(pickle.dumps(s)) == s
+
+
+def test_sorted_set():
+    s = SortedSet([5, 1, 3, 1])
+    s.add(2)
+    s.discard(3)
+    assert list(s) == [1, 2, 5]
+    assert s[0] == 1
+    assert s[-1] == 5
+    assert isinstance(s[1:], SortedSet)
+    assert list(s[1:]) == [2, 5]
+    assert s.index(5) == 2
+    assert list(s | [0, 9]) == [0, 1, 2, 5, 9]
+    assert list(s & [5, 2, 7]) == [2, 5]
+    assert list(s - [1]) == [2, 5]
+    assert list(s ^ [1, 9]) == [2, 5, 9]
+    assert list(s.irange(2, 5, inclusive=(True, False))) == [2]
+    assert s == {1, 2, 5}
+    assert s.pop() == 5
+    assert s.pop(0) == 1
+    assert list(s) == [2]
+    assert pickle.loads(pickle.dumps(s)) == s
+
+
+def test_sorted_dict():
+    d = SortedDict({'b': 1, 'a': 2}, c=3)
+    assert d.keys() == ['a', 'b', 'c']
+    assert d.values() == [2, 1, 3]
+    del d['b']
+    d['d'] = 4
+    d.update({'e': 5, 'a': 0})
+    assert d.items() == [('a', 0), ('c', 3), ('d', 4), ('e', 5)]
+    assert d.peekitem(0) == ('a', 0)
+    assert d.index('d') == 2
+    assert list(d.irange('b', 'd')) == ['c', 'd']
+    assert d.popitem() == ('e', 5)
+    assert d.pop('c') == 3
+    assert d.pop('c', None) is None
+    assert d.setdefault('b', 7) == 7
+    assert list(d) == ['a', 'b', 'd']
+    assert pickle.loads(pickle.dumps(d)) == d
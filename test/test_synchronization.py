@@ -34,10 +34,13 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
+import tempfile
+from multiprocessing import Process
 from threading import Thread, Lock, RLock
 from time import time, sleep
 
-from lck.concurrency import synchronized
+from lck.concurrency import synchronized, SharedMemoryLock
 
 SLEEP_AMOUNT=0.05 #seconds
 
@@ -132,3 +135,49 @@ def test_filebased_synchronization(sleep_amount=SLEEP_AMOUNT):
     for t in threads:
         t.join()
     assert result == range(10) * 10
+
+
+def test_shared_memory_synchronization(sleep_amount=SLEEP_AMOUNT):
+    lock = SharedMemoryLock('lck-test-{}'.format(os.getpid()))
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+
+    @synchronized(lock=lock)
+    def append_range():
+        for i in xrange(10):
+            with open(path, 'a') as f:
+                f.write(b'{}'.format(i))
+            sleep(sleep_amount / 10)
+
+    try:
+        assert lock.acquire(blocking=False)
+        assert not lock.acquire(blocking=False)
+        assert not lock.acquire(timeout=sleep_amount)
+        lock.release()
+
+        processes = [Process(target=append_range) for i in range(5)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        with open(path) as f:
+            assert f.read() == b'0123456789' * 5
+    finally:
+        lock.unlink()
+        os.unlink(path)
+
+
+def test_shared_memory_lock_closed():
+    lock = SharedMemoryLock('lck-test-closed-{}'.format(os.getpid()))
+    try:
+        lock.close()
+        lock.close()
+        for method in (lock.acquire, lock.release):
+            try:
+                method()
+            except ValueError:
+                pass
+            else:
+                assert False, "Exception not raised."
+    finally:
+        lock.unlink()
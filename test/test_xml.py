@@ -0,0 +1,347 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2011 by Łukasz Langa
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+"""XML conversion tests
+   --------------------
+
+   Tests use the ``py.test`` framework. Run as::
+
+       $ easy_install -U py
+       $ py.test
+   """
+
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+import pickle
+from xml.etree import cElementTree as ET
+
+import pytest
+
+from lck.xml import etree_to_dict, iter_records, RecordConverter
+from lck.xml import iter_fields, dict_to_xml
+from lck.xml import iter_records_parallel
+from lck.xml import decode_entities, decode_entities_many
+from lck.xml import iter_decode_entities
+from lck.xml import converters
+
+
+NS = '{http://example.com/ns}'
+FEED = b"""<?xml version="1.0"?>
+<feed xmlns="http://example.com/ns">
+  <header><title>Feed</title></header>
+  <item>
+    <id>1</id><name>first</name><price>1.5</price>
+    <tag>a</tag><tag>b</tag>
+    <updated>2011-01-02T03:04:05</updated>
+  </item>
+  <item>
+    <id>2</id><name>second</name>
+    <item><id>3</id></item>
+  </item>
+  <item/>
+</feed>
+"""
+
+
+def test_etree_to_dict():
+    tag, feed = etree_to_dict(ET.fromstring(FEED), namespace=NS)
+    assert tag == 'feed'
+    assert feed['header'] == {'title': 'Feed'}
+    first = feed['item'][0]
+    assert first == {'id': 1, 'name': 'first', 'price': 1.5,
+        'tag': ['a', 'b'], 'updated': datetime(2011, 1, 2, 3, 4, 5)}
+    assert feed['item'][1]['item'] == {'id': 3}
+    assert feed['item'][2] is None
+    assert etree_to_dict(ET.fromstring(FEED),
+        namespace='{http://other}') == (None, None)
+
+
+def test_iter_records():
+    tree = ET.fromstring(FEED)
+    expected = [etree_to_dict(item, namespace=NS)
+        for item in tree.findall(NS + 'item')]
+    records = list(iter_records(BytesIO(FEED), 'item', namespace=NS))
+    assert records == expected
+    assert [tag for tag, _ in records] == ['item'] * 3
+    # nested records are only part of the outer one
+    assert records[1][1]['item'] == {'id': 3}
+    assert list(iter_records(BytesIO(FEED), 'title', namespace=NS)) == [
+        ('title', 'Feed')]
+    assert list(iter_records(BytesIO(FEED), 'missing', namespace=NS)) == []
+
+
+def test_iter_records_many():
+    items = b''.join(b'<item><id>%d</id></item>' % i for i in xrange(1000))
+    source = BytesIO(b'<feed>' + items + b'</feed>')
+    count = 0
+    for tag, record in iter_records(source, 'item'):
+        assert record == {'id': count}
+        count += 1
+    assert count == 1000
+
+
+def test_etree_to_dict_deep():
+    depth = 5000
+    tree = ET.fromstring(b'<a>' * depth + b'1' + b'</a>' * depth)
+    tag, value = etree_to_dict(tree)
+    assert tag == 'a'
+    for _ in xrange(depth - 2):
+        value = value['a']
+    assert value == {'a': 1}
+
+
+def test_leaf_conversion():
+    def generic(text):
+        for converter in converters._default_converters:
+            try:
+                return converter(text)
+            except (ValueError, TypeError):
+                continue
+        return text
+    for text in (None, '', ' ', 'text', '12abc', '1', ' -1 ', '- 1', '+1',
+        '12345678901234567890', '1.5', '.5', '5.', '-1e5', 'inf', ' NaN',
+        '\u0661\u0662', '0x10', '2011-01-02T03:04:05', '2011-1-2t3:4:5',
+        '2011-01-02T03:04:05+01:00', '2011-01-02T03:04:05Z', '2011-01-02',
+        ' 2011-01-02T03:04:05'):
+        expected = generic(text)
+        result = converters._convert_text(text)
+        assert type(result) == type(expected)
+        assert result == expected or result != result
+
+
+def test_hints():
+    xml = b'<item><zip>01234</zip><price>1.10</price><id>1</id></item>'
+    hints = {'zip': None, 'price': Decimal}
+    assert etree_to_dict(ET.fromstring(xml), hints=hints) == ('item',
+        {'zip': '01234', 'price': Decimal('1.10'), 'id': 1})
+    assert list(iter_records(BytesIO(b'<r>' + xml + b'</r>'), 'item',
+        hints={'id': str})) == [('item', {'zip': 1234, 'price': 1.1,
+        'id': '1'})]
+
+
+def test_record_converter():
+    records = [ET.fromstring(xml) for xml in (
+        b'<item><id>1</id><when>2011-01-02T03:04:05</when><tag>a</tag>'
+        b'<meta><x>1.5</x></meta></item>',
+        b'<item><id>2</id><when>2011-01-02T03:04:05+01:00</when><tag>a</tag>'
+        b'<tag>b</tag><meta><x>2</x></meta></item>',
+    )]
+    changed = [ET.fromstring(xml) for xml in (
+        b'<item><id>x</id><when>never</when><meta>none</meta></item>',
+        b'<item><id>3</id><new><y>1</y></new><meta><x/><x/></meta></item>',
+        b'<item>leaf</item>',
+        b'<other><id>4</id></other>',
+    )]
+    convert = RecordConverter(samples=2)
+    for element in records + records + changed:
+        assert convert(element) == etree_to_dict(element)
+    assert convert.fallbacks == 4
+    convert = RecordConverter(samples=1, hints={'id': str})
+    for element in records + changed:
+        assert convert(element) == etree_to_dict(element,
+            hints={'id': str})
+
+
+def test_iter_records_learn():
+    expected = list(iter_records(BytesIO(FEED), 'item', namespace=NS))
+    assert list(iter_records(BytesIO(FEED), 'item', namespace=NS,
+        learn=1)) == expected
+
+
+def test_scan_records():
+    expected = list(converters._scan_records(BytesIO(FEED), 'item', NS))
+    assert expected[0] == (b'<?xml version="1.0"?>'
+        b'<records xmlns="http://example.com/ns">')
+    assert len(expected) == 4
+    offset, raw = expected[-1]
+    assert raw == b'<item/>'
+    assert FEED[offset:offset + len(raw)] == raw
+    for block_size in (1, 2, 3, 7, 64):
+        assert list(converters._scan_records(BytesIO(FEED), 'item', NS,
+            block_size=block_size)) == expected
+    xml = b'<f xmlns="urn:a" xmlns:b="urn:b"><b:item/><item a="/>"/></f>'
+    records = list(converters._scan_records(BytesIO(xml), 'item', '{urn:a}'))
+    assert [raw for _, raw in records[1:]] == [b'<item a="/>"/>']
+
+
+def test_iter_records_parallel():
+    expected = list(iter_records(BytesIO(FEED), 'item', namespace=NS))
+    assert list(iter_records_parallel(BytesIO(FEED), 'item', namespace=NS,
+        workers=2)) == expected
+    items = b''.join(b'<x:item a="1"><x:id>%d</x:id></x:item><x:other/>' % i
+        for i in xrange(1000))
+    xml = b'<x:feed xmlns:x="http://example.com/ns">' + items + b'</x:feed>'
+    records = list(iter_records_parallel(BytesIO(xml), 'item', namespace=NS,
+        workers=2, chunksize=10))
+    assert records == [('item', {'id': i}) for i in xrange(1000)]
+    for xml in (
+        # a foreign prefix declared on the root
+        b'<f xmlns="urn:a" xmlns:x="urn:x"><x:item><item>1</item></x:item>'
+        b'<item>2</item></f>',
+        # a foreign prefix declared below the root
+        b'<f xmlns="urn:a"><x:item xmlns:x="urn:x"><item>1</item></x:item>'
+        b'<item>2</item></f>',
+        # the root is a record
+        b'<item xmlns="urn:a"><item>1</item><item>2</item></item>',
+        b'<f xmlns="urn:a"><item a="x>y"/><item a=\'/>\'>2</item></f>',
+        b'<!DOCTYPE f [<!ENTITY e "1">]><f xmlns="urn:a"><item>&e;</item>'
+        b'<item>2</item></f>',
+        b'<f xmlns="urn:a"><item>1</item><!-- <item>2</item> -->'
+        b'<item>3<!-- </item> --></item></f>',
+        b'<f xmlns="urn:a"><item>1</item><g xmlns="urn:b"><item>2</item>'
+        b'</g><item>3</item></f>',
+    ):
+        expected = list(iter_records(BytesIO(xml), 'item',
+            namespace='{urn:a}'))
+        assert list(iter_records_parallel(BytesIO(xml), 'item',
+            namespace='{urn:a}', workers=2)) == expected
+    # falling back after records were already yielded
+    xml = (b'<f xmlns="urn:a">' + b'<item>1</item>' * 200 +
+        b'<g xmlns="urn:b"><item>2</item></g><item>3</item></f>')
+    records = list(iter_records_parallel(BytesIO(xml), 'item',
+        namespace='{urn:a}', workers=1, chunksize=1))
+    assert records == [('item', 1)] * 200 + [('item', 3)]
+    xml = b'<root><item><v>1</v></item><item><v>2</v><x></item></root>'
+    try:
+        list(iter_records_parallel(BytesIO(xml), 'item', workers=2))
+    except ValueError as e:
+        assert 'offset 27' in unicode(e)
+    else:
+        assert False, "Exception not raised."
+
+
+def test_decode_entities():
+    assert decode_entities('no entities') == 'no entities'
+    assert decode_entities('&lt;a&gt; &amp; &#65;&#x42; &unknown; &copy;'
+        ) == '<a> & AB &unknown; \xa9'
+    assert decode_entities(b'&copy; &amp;', 'utf8') == b'\xc2\xa9 &'
+    assert decode_entities(b'&copy; &amp;', 'latin1') == b'\xa9 &'
+    assert decode_entities_many(['a &amp; b', 'c', b'&#322;'],
+        'utf8') == [b'a & b', 'c', b'\xc5\x82']
+
+
+def test_iter_decode_entities():
+    text = 'Fish &amp; chips &#169; &#x142;&unknown;&copy' * 50
+    expected = decode_entities(text.encode('utf8'), 'utf8')
+    for chunk_size in (1, 2, 5, 11, 12, 13, 1000):
+        source = BytesIO(text.encode('utf8'))
+        assert b''.join(iter_decode_entities(source, 'utf8',
+            chunk_size=chunk_size)) == expected
+
+
+def test_dict_to_xml():
+    out = BytesIO()
+    dict_to_xml('feed', {'item': [{'id': 1, 'tag': ('a', 'b')}, None]}, out,
+        xml_declaration=False)
+    assert out.getvalue() in (
+        b'<feed><item><id>1</id><tag>a</tag><tag>b</tag></item><item/></feed>',
+        b'<feed><item><tag>a</tag><tag>b</tag><id>1</id></item><item/></feed>')
+    out = BytesIO()
+    dict_to_xml('text', 'Fish & chips \u0142', out, encoding='ascii')
+    assert out.getvalue() == (b'<?xml version="1.0" encoding="ascii"?>\n'
+        b'<text>Fish &amp; chips &#322;</text>')
+
+
+def test_dict_to_xml_round_trip():
+    tag, feed = etree_to_dict(ET.fromstring(FEED), namespace=NS)
+    feed['item'].append({'price': 1.0 / 3, 'name': '<&>'})
+    out = BytesIO()
+    dict_to_xml(tag, feed, out, namespace=NS, buffer_size=10)
+    assert etree_to_dict(ET.fromstring(out.getvalue()),
+        namespace=NS) == (tag, feed)
+    out = BytesIO()
+    records = ({'id': i} for i in xrange(1000))
+    dict_to_xml('feed', {'item': records}, out)
+    assert etree_to_dict(ET.fromstring(out.getvalue())) == ('feed',
+        {'item': [{'id': i} for i in xrange(1000)]})
+
+
+def test_iso8601():
+    parse = converters._datetime
+    assert parse('2011-01-02T03:04:05') == datetime(2011, 1, 2, 3, 4, 5)
+    assert parse('2011-1-2t3:4:5') == datetime(2011, 1, 2, 3, 4, 5)
+    assert parse('2011-01-02T03:04:05.5') == datetime(2011, 1, 2, 3, 4, 5,
+        500000)
+    assert parse('2011-01-02T03:04:05.1234567Z').microsecond == 123456
+    utc = parse('2011-01-02T03:04:05Z')
+    assert utc.utcoffset() == timedelta(0)
+    assert utc.tzname() == 'UTC'
+    for designator in ('+01:00', '+0100', '+01'):
+        value = parse('2011-01-02T03:04:05' + designator)
+        assert value.utcoffset() == timedelta(hours=1)
+        assert value == utc - timedelta(hours=1)
+    value = parse('2011-01-02T03:04:05-05:30')
+    assert value.tzname() == '-05:30'
+    assert value.tzinfo is parse('2011-01-02T00:00:00-05:30').tzinfo
+    assert pickle.loads(pickle.dumps(value)) == value
+    for text in ('2011-01-02', '2011-01-02T03:04', '2011-13-02T03:04:05',
+        '2011-01-02T03:04:05+25:00', '2011-01-02T03:04:05 ',
+        '2011-01-02T03:04:05\n', '2011-01-02T03:04:05+1'):
+        with pytest.raises(ValueError):
+            parse(text)
+    # cElementTree returns ASCII text as byte strings
+    xml = (b'<t><a>2011-01-02T03:04:05.5</a>'
+        b'<b>2011-01-02T03:04:05.25+01:00</b></t>')
+    assert etree_to_dict(ET.fromstring(xml)) == ('t', {
+        'a': datetime(2011, 1, 2, 3, 4, 5, 500000),
+        'b': utc - timedelta(hours=1, microseconds=-250000)})
+    assert parse(b'2011-01-02T03:04:05.5+01:00').microsecond == 500000
+
+
+def test_iter_fields():
+    fields = list(iter_fields(BytesIO(FEED), ['item/price', 'item/tag',
+        'item/item', 'item/missing/id'], namespace=NS))
+    assert fields == [
+        ('item', {'price': 1.5, 'tag': ['a', 'b']}),
+        ('item', {'item': {'id': 3}}),
+        ('item', {}),
+    ]
+    fields = list(iter_fields(BytesIO(FEED), ['/item/item/id/', 'item/id'],
+        namespace=NS, hints={'id': str}))
+    assert fields == [
+        ('item', {'id': '1'}),
+        ('item', {'id': '2', 'item': {'id': '3'}}),
+        ('item', {}),
+    ]
+    assert list(iter_fields(BytesIO(FEED), ['item', 'item/id'],
+        namespace=NS)) == list(iter_records(BytesIO(FEED), 'item',
+        namespace=NS))
+    assert list(iter_fields(BytesIO(FEED), ['feed/header/title'])) == []
+    assert list(iter_fields(BytesIO(FEED), ['feed/header/title'],
+        namespace=NS)) == [('feed', {'header': {'title': 'Feed'}})]
+    # elements which aren't requested are cleared before the record ends
+    record_tag, trie = converters._path_trie(['item/price', 'item/item/id'],
+        namespace=NS)
+    children = converters._iter_records(BytesIO(FEED), NS + record_tag,
+        lambda element: [child.tag for child in element
+            if len(child) or child.text], trie)
+    assert list(children) == [[NS + 'price'], [NS + 'item'], []]
+    with pytest.raises(ValueError):
+        iter_fields(BytesIO(FEED), ['item/id', 'feed/header'])
+    with pytest.raises(ValueError):
+        iter_fields(BytesIO(FEED), [])